@@ -37,12 +37,34 @@
 # This file should not be modified for normal use.
 # To create a package, run "python setup.py sdist bdist_wheel".
 # To install the package, run "pip install dist/metaforge-<version>-py3-none-any.whl".
+# If Cython is installed, the PE serializer, the register allocator, the
+# x64 assembler and the C code generator are compiled to native extensions;
+# otherwise the pure-Python modules are used.
+from setuptools import setup, find_packages
+
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize(
+        [
+            "src/compiler/backend/pe_generator.py",
+            "src/compiler/backend/register_allocator.py",
+            "src/compiler/backend/x64_assembler.py",
+            "src/compiler/code_generator.py",
+        ],
+        compiler_directives={'language_level': "3"},
+    )
+except ImportError:
+    ext_modules = []
 
 setup(
     name="metaforge",
     version="0.1.0",
     packages=find_packages(),
     install_requires=[],
+    extras_require={
+        'lief': ['lief>=0.15,<0.16'],
+    },
+    ext_modules=ext_modules,
     entry_points={
         'console_scripts': [
             'metaforge=src.compiler.main:main',
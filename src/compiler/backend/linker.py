@@ -46,7 +46,7 @@ from dataclasses import dataclass
 from typing import Dict, List, Set, Optional, Tuple
 from pathlib import Path
 import struct
-from .pe_generator import PEGenerator, Section
+from .pe_generator import PEGenerator
 
 @dataclass
 class Symbol:
@@ -109,8 +109,8 @@ class Linker:
                     is_external=True
                 )
                 
-    def link(self) -> bytes:
-        """Performs linking and generates executable file"""
+    def link(self, output_file: Path):
+        """Performs linking and writes the executable file"""
         # Allocate addresses for symbols
         self._allocate_addresses()
         
@@ -118,7 +118,7 @@ class Linker:
         self._apply_relocations()
         
         # Generate PE file
-        return self._generate_pe()
+        self._generate_pe(output_file)
         
     def _allocate_addresses(self):
         """Allocates virtual addresses for all symbols"""
@@ -177,39 +177,25 @@ class Linker:
                 
         return None
         
-    def _generate_pe(self) -> bytes:
-        """Generates the final PE file"""
+    def _generate_pe(self, output_file: Path):
+        """Writes the final PE file"""
+        # The PE generator lays out exactly one code and one data section
+        extra = sorted(set(self.sections) - {'.text', '.data'})
+        if extra:
+            raise ValueError(f"Cannot link sections other than .text and .data: {', '.join(extra)}")
+            
         pe = PEGenerator()
         
-        # Add sections
-        for name, data in self.sections.items():
-            characteristics = 0
-            if name == '.text':
-                characteristics = 0x60000020  # CODE|EXECUTE|READ
-            elif name == '.data':
-                characteristics = 0xC0000040  # INITIALIZED_DATA|READ|WRITE
-                
-            pe.add_section(Section(
-                name=name,
-                virtual_address=self.symbols[name].address,
-                virtual_size=len(data),
-                raw_data_size=len(data),
-                raw_data_ptr=0,  # Will be calculated by PE generator
-                characteristics=characteristics,
-                data=data
-            ))
-            
         # Add imports
         for dll, functions in self.imports.items():
-            for func in functions:
-                pe.add_import(dll, func)
-                
+            pe.add_import(dll, functions)
+            
         # Set entry point
         if '_start' in self.symbols:
             pe.entry_point = self.symbols['_start'].address
             
         # Generate PE file
-        return pe.generate()
+        pe.generate(output_file, self.sections.get('.text', b''), self.sections.get('.data', b''))
         
     def _parse_object(self, data: bytes) -> Tuple[Dict[str, Symbol], List[Relocation], Dict[str, bytes]]:
         """Parses a COFF object file"""
@@ -43,18 +43,37 @@
 # ---------------------------------------------------------------------------------
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Dict, Optional, BinaryIO
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, Union
+from itertools import accumulate
+from bisect import bisect_left
+from array import array
 import struct
 from pathlib import Path
 import os
 import logging
+import mmap
 import stat
 import time
 import tempfile
 import shutil
 import uuid
 import sys
-import ctypes
+
+# Optional native PE builder, selected with METAFORGE_PE_BACKEND=lief
+try:
+    import lief
+except ImportError:
+    lief = None
+
+# LIEF releases whose PE builder API _generate_lief targets: [min, max)
+_LIEF_VERSIONS = ((0, 15), (0, 16))
+
+# Flags for opening the output image (O_BINARY only exists on Windows)
+_OUTPUT_FLAGS = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+# Anything the header writers can pack into
+WritableBuffer = Union[bytearray, memoryview, mmap.mmap]
 
 # PE File Format Constants
 IMAGE_DOS_SIGNATURE = 0x5A4D
@@ -67,7 +86,119 @@ IMAGE_NUMBEROF_DIRECTORY_ENTRIES = 16
 IMAGE_SECTION_ALIGNMENT = 0x1000
 IMAGE_FILE_ALIGNMENT = 0x200
 
-@dataclass
+# Data directory indices
+IMAGE_DIRECTORY_ENTRY_EXPORT = 0
+IMAGE_DIRECTORY_ENTRY_IMPORT = 1
+IMAGE_DIRECTORY_ENTRY_BASERELOC = 5
+IMAGE_DIRECTORY_ENTRY_IAT = 12
+
+# DOS stub program: prints "This program cannot be run in DOS mode." and exits
+_DOS_STUB = bytes.fromhex(
+    '0e1fba0e00b409cd21b8014ccd215468'
+    '69732070726f6772616d2063616e6e6f'
+    '742062652072756e20696e20444f5320'
+    '6d6f64652e0d0d0a2400000000000000'
+)
+
+# MZ header with e_lfanew (offset 0x3C) pointing just past the stub at 0x80
+_DOS_HEADER = (
+    struct.pack('<H', IMAGE_DOS_SIGNATURE) + bytes(0x3A) +
+    struct.pack('<I', 0x40 + len(_DOS_STUB)) +
+    _DOS_STUB
+)
+
+# Name, VirtualSize, VirtualAddress, SizeOfRawData, PointerToRawData,
+# PointerToRelocations, PointerToLinenumbers, NumberOfRelocations,
+# NumberOfLinenumbers, Characteristics
+_SECTION_HEADER = struct.Struct('<8sIIIIIIHHI')
+
+# PE signature, File Header, PE32+ Optional Header and 16 data directories
+_NT_HEADERS = struct.Struct('<I' 'HHIIIHH' 'HBBIIIII' 'QIIHHHHHHIIIIHHQQQQII' + 'II' * IMAGE_NUMBEROF_DIRECTORY_ENTRIES)
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+# OriginalFirstThunk, TimeDateStamp, ForwarderChain, Name, FirstThunk
+_IMPORT_DESCRIPTOR = struct.Struct('<IIIII')
+
+# Characteristics, TimeDateStamp, MajorVersion, MinorVersion, Name, OrdinalBase,
+# NumberOfFunctions, NumberOfNames, AddressOfFunctions, AddressOfNames,
+# AddressOfNameOrdinals
+_EXPORT_DIRECTORY = struct.Struct('<IIHHIIIIIII')
+
+# Page RVA, Block Size
+_RELOC_BLOCK_HEADER = struct.Struct('<II')
+
+@lru_cache(maxsize=1024)
+def _ascii(name: str) -> bytes:
+    """Encodes a section, DLL or symbol name, caching the result"""
+    return name.encode('ascii')
+
+@lru_cache(maxsize=1024)
+def _hint_name_entry(function: str) -> bytes:
+    """Builds a Hint/Name Table entry: hint (0 for now), name, NULL terminator, padded to even length"""
+    entry = _U16.pack(0) + _ascii(function) + b'\0'
+    return entry + b'\0' if len(entry) & 1 else entry
+
+# Offsets of the per-image fields patched into a cached NT headers template
+_NT_OFFSET_SIZE_OF_CODE = 28
+_NT_OFFSET_SIZE_OF_INITIALIZED_DATA = 32
+_NT_OFFSET_ENTRY_POINT = 40
+_NT_OFFSET_SIZE_OF_IMAGE = 80
+_NT_OFFSET_CHECKSUM = 88
+
+@lru_cache(maxsize=8)
+def _nt_headers_template(machine: int, characteristics: int, subsystem: int,
+                         num_sections: int, headers_size: int, image_base: int,
+                         directories: Tuple[int, ...]) -> bytes:
+    """Builds the NT headers with every per-image field left as zero.
+    
+    directories holds the RVA, Size pairs of all 16 data directories.
+    """
+    return _NT_HEADERS.pack(
+        IMAGE_NT_SIGNATURE,     # Signature
+        # File Header
+        machine,                # Machine
+        num_sections,           # NumberOfSections
+        0,                      # TimeDateStamp
+        0,                      # PointerToSymbolTable
+        0,                      # NumberOfSymbols
+        0xF0,                   # SizeOfOptionalHeader
+        characteristics,        # Characteristics
+        # Optional Header
+        0x20B,                  # Magic (PE32+)
+        1,                      # MajorLinkerVersion
+        0,                      # MinorLinkerVersion
+        0,                      # SizeOfCode (patched)
+        0,                      # SizeOfInitializedData (patched)
+        0,                      # SizeOfUninitializedData
+        0,                      # AddressOfEntryPoint (patched)
+        0x1000,                 # BaseOfCode
+        image_base,             # ImageBase
+        IMAGE_SECTION_ALIGNMENT,  # SectionAlignment
+        IMAGE_FILE_ALIGNMENT,   # FileAlignment
+        6,                      # MajorOperatingSystemVersion
+        0,                      # MinorOperatingSystemVersion
+        0,                      # MajorImageVersion
+        0,                      # MinorImageVersion
+        6,                      # MajorSubsystemVersion
+        0,                      # MinorSubsystemVersion
+        0,                      # Win32VersionValue
+        0,                      # SizeOfImage (patched)
+        headers_size,           # SizeOfHeaders
+        0,                      # CheckSum
+        subsystem,              # Subsystem
+        0x8160,                 # DllCharacteristics
+        0x100000,               # SizeOfStackReserve
+        0x1000,                 # SizeOfStackCommit
+        0x100000,               # SizeOfHeapReserve
+        0x1000,                 # SizeOfHeapCommit
+        0,                      # LoaderFlags
+        IMAGE_NUMBEROF_DIRECTORY_ENTRIES,  # NumberOfRvaAndSizes
+        *directories            # Data Directories
+    )
+
+@dataclass(slots=True)
 class Section:
     name: str
     virtual_address: int
@@ -75,13 +206,13 @@ class Section:
     raw_data_size: int
     raw_data_ptr: int
     characteristics: int
-    data: bytes
+    data: Union[bytes, bytearray, memoryview]  # Stored as given, never copied
 
 class PEGenerator:
     def __init__(self):
         self.sections: List[Section] = []
         self.imports: Dict[str, List[str]] = {}  # DLL -> [function names]
-        self.exports: List[str] = []
+        self.exports: Dict[str, int] = {}  # Function name -> RVA
         self.relocations: List[tuple] = []  # [(rva, type), ...]
         self.entry_point: int = 0
         self.machine: int = IMAGE_FILE_MACHINE_AMD64
@@ -89,174 +220,30 @@ class PEGenerator:
         self.subsystem: int = IMAGE_SUBSYSTEM_WINDOWS_CUI
         self.image_base: int = 0x400000
         
-    def generate(self, output_file: Path) -> bool:
-        try:
-            # Add import section if needed
-            if self.imports:
-                self._add_import_section()
-                
-            # Add export section if needed
-            if self.exports:
-                self._add_export_section()
-                
-            # Add relocation section if needed
-            if self.relocations:
-                self._add_relocation_section()
-                
-            # Calculate file layout
-            file_offset = self._calculate_headers_size()
-            image_size = file_offset
-            
-            for section in self.sections:
-                # Align section's virtual address
-                section.virtual_address = self._align_up(image_size, IMAGE_SECTION_ALIGNMENT)
-                image_size = section.virtual_address + self._align_up(section.virtual_size, IMAGE_SECTION_ALIGNMENT)
-                
-                # Align raw data
-                section.raw_data_ptr = self._align_up(file_offset, IMAGE_FILE_ALIGNMENT)
-                file_offset = section.raw_data_ptr + self._align_up(section.raw_data_size, IMAGE_FILE_ALIGNMENT)
-                
-            # Generate PE file
-            with open(output_file, 'wb') as f:
-                # DOS Header
-                f.write(self._generate_dos_header())
-                
-                # NT Headers
-                f.write(self._generate_nt_headers(image_size))
-                
-                # Section Headers
-                f.write(self._generate_section_headers())
-                
-                # Section Data
-                for section in self.sections:
-                    # Pad to section alignment
-                    while f.tell() < section.raw_data_ptr:
-                        f.write(b'\0')
-                        
-                    # Write section data
-                    f.write(section.data)
-                    
-                    # Pad to file alignment
-                    aligned_size = self._align_up(section.raw_data_size, IMAGE_FILE_ALIGNMENT)
-                    while f.tell() < section.raw_data_ptr + aligned_size:
-                        f.write(b'\0')
-                        
-            return True
-            
-        except Exception as e:
-            logging.error(f"Error generating PE file: {str(e)}", exc_info=True)
-            return False
-            
-    def _generate_dos_header(self) -> bytes:
-        """Generates DOS header and stub"""
-        # Basic DOS header
-        dos_header = bytearray(64)
-        
-        # MZ signature
-        struct.pack_into('<H', dos_header, 0, IMAGE_DOS_SIGNATURE)
-        
-        # Offset to PE header
-        struct.pack_into('<I', dos_header, 0x3C, 64)
-        
-        # DOS stub (simple ret)
-        dos_stub = b'\x0E\x1F\xBA\x0E\x00\xB4\x09\xCD\x21\xB8\x01\x4C\xCD\x21'
-        dos_header[64-len(dos_stub):64] = dos_stub
-        
-        return bytes(dos_header)
-        
-    def _generate_nt_headers(self, image_size: int) -> bytes:
-        """Generates NT headers"""
-        # PE Signature
-        nt_headers = struct.pack('<I', IMAGE_NT_SIGNATURE)
-        
-        # File Header
-        nt_headers += struct.pack('<HHIIIHH',
-            self.machine,                    # Machine
-            len(self.sections),              # NumberOfSections
-            int(time.time()),                # TimeDateStamp
-            0,                               # PointerToSymbolTable
-            0,                               # NumberOfSymbols
-            224,                             # SizeOfOptionalHeader
-            self.characteristics             # Characteristics
-        )
-        
-        # Optional Header
-        nt_headers += struct.pack('<HBBIIIIIIIIIHHHHHHIIIIII',
-            0x20B,                          # Magic (PE32+)
-            1,                              # MajorLinkerVersion
-            0,                              # MinorLinkerVersion
-            0,                              # SizeOfCode
-            0,                              # SizeOfInitializedData
-            0,                              # SizeOfUninitializedData
-            self.entry_point,               # AddressOfEntryPoint
-            0x1000,                         # BaseOfCode
-            self.image_base,                # ImageBase
-            IMAGE_SECTION_ALIGNMENT,        # SectionAlignment
-            IMAGE_FILE_ALIGNMENT,           # FileAlignment
-            6,                              # MajorOperatingSystemVersion
-            0,                              # MinorOperatingSystemVersion
-            0,                              # MajorImageVersion
-            0,                              # MinorImageVersion
-            6,                              # MajorSubsystemVersion
-            0,                              # MinorSubsystemVersion
-            0,                              # Win32VersionValue
-            image_size,                     # SizeOfImage
-            self._calculate_headers_size(),  # SizeOfHeaders
-            0,                              # CheckSum
-            self.subsystem,                 # Subsystem
-            0x8160,                         # DllCharacteristics
-            0x100000,                       # SizeOfStackReserve
-            0x1000,                         # SizeOfStackCommit
-            0x100000,                       # SizeOfHeapReserve
-            0x1000                          # SizeOfHeapCommit
-        )
-        
-        # Data Directories
-        for i in range(IMAGE_NUMBEROF_DIRECTORY_ENTRIES):
-            nt_headers += struct.pack('<II', 0, 0)
-            
-        return nt_headers
-        
-    def _generate_section_headers(self) -> bytes:
-        """Generates section headers"""
-        headers = bytearray()
-        
-        for section in self.sections:
-            # Convert name to bytes (padded with nulls)
-            name_bytes = section.name.encode('ascii')[:8]
-            name_bytes = name_bytes.ljust(8, b'\0')
-            
-            headers += name_bytes
-            
-            headers += struct.pack('<IIIIIIII',
-                section.virtual_size,        # VirtualSize
-                section.virtual_address,     # VirtualAddress
-                section.raw_data_size,       # SizeOfRawData
-                section.raw_data_ptr,        # PointerToRawData
-                0,                           # PointerToRelocations
-                0,                           # PointerToLinenumbers
-                0,                           # NumberOfRelocations
-                section.characteristics      # Characteristics
-            )
-            
-        return bytes(headers)
+        # Data directory index -> (RVA, Size), filled in as sections are added
+        self._data_directories: Dict[int, Tuple[int, int]] = {}
         
-    def _calculate_headers_size(self) -> int:
-        """Calculates total size of headers"""
-        return self._align_up(
-            64 +                            # DOS Header
-            4 +                             # PE Signature
-            20 +                            # File Header
-            224 +                           # Optional Header
-            len(self.sections) * 40,        # Section Headers
-            IMAGE_FILE_ALIGNMENT
-        )
+        # Layout computed once by _finalize_layout()
+        self._headers_size: int = 0
+        self._image_size: int = 0
+        self._file_size: int = 0
+        self._code_size: int = 0
+        self._initialized_data_size: int = 0
         
-    def _align_up(self, value: int, alignment: int) -> int:
-        """Aligns value up to the nearest multiple of alignment"""
+    @staticmethod
+    def _align_up(value: int, alignment: int) -> int:
+        """Aligns value up to the nearest multiple of alignment (a power of two)"""
         return (value + alignment - 1) & ~(alignment - 1)
         
     def add_section(self, section: Section):
+        """Adds a section, rounding its raw size up to the file alignment.
+        
+        The payload itself is not padded: the output image starts zero-filled,
+        so the bytes between the end of the data and the next section are
+        already zero.
+        """
+        file_mask = IMAGE_FILE_ALIGNMENT - 1
+        section.raw_data_size = (section.raw_data_size + file_mask) & ~file_mask
         self.sections.append(section)
         
     def add_import(self, dll: str, functions: List[str]):
@@ -264,103 +251,84 @@ class PEGenerator:
             self.imports[dll] = []
         self.imports[dll].extend(functions)
         
-    def add_export(self, function: str):
-        self.exports.append(function)
+    def add_export(self, function: str, rva: int):
+        self.exports[function] = rva
         
     def add_relocation(self, rva: int, type: int):
         self.relocations.append((rva, type))
         
+    def _next_virtual_address(self) -> int:
+        """Returns the section-aligned RVA just past the last section"""
+        if not self.sections:
+            return self._align_up(self._calculate_headers_size(), IMAGE_SECTION_ALIGNMENT)
+        last = self.sections[-1]
+        return self._align_up(last.virtual_address + max(last.virtual_size, 1), IMAGE_SECTION_ALIGNMENT)
+        
     def _add_import_section(self):
         """Adds the import section"""
-        # Calculate required size
-        size = 0
+        # Every pointer in the import data is an RVA, so place the section first
+        section_rva = self._next_virtual_address()
         
-        # Import Directory Table
-        size += (len(self.imports) + 1) * 20  # +1 for NULL terminator
+        # Sort once so the layout doesn't depend on add_import() call order
+        items = sorted((dll, sorted(functions)) for dll, functions in self.imports.items())
+        
+        # Import Lookup Tables follow the Import Directory Table (+1 for NULL terminators),
+        # then an Import Address Table of the same shape for the loader to overwrite
+        idt_size = (len(items) + 1) * _IMPORT_DESCRIPTOR.size
+        thunk_sizes = [(len(functions) + 1) * 8 for _, functions in items]
+        ilt_offsets = list(accumulate(thunk_sizes, initial=idt_size))
+        iat_offsets = list(accumulate(thunk_sizes, initial=ilt_offsets.pop()))
+        hint_name_offset = iat_offsets.pop()
         
-        # Import Lookup Tables
-        for functions in self.imports.values():
-            size += (len(functions) + 1) * 8  # +1 for NULL terminator
-            
         # Hint/Name Table
-        name_table_size = 0
-        for dll, functions in self.imports.items():
-            name_table_size += len(dll) + 1  # DLL name + NULL
-            for func in functions:
-                name_table_size += 2 + len(func) + 1  # Hint + name + NULL
-                
-        size += name_table_size
+        hint_names = [
+            _hint_name_entry(func)
+            for _, functions in items
+            for func in functions
+        ]
+        hint_name_rvas = iter(accumulate(map(len, hint_names), initial=section_rva + hint_name_offset))
+        
+        # DLL names (DLL name + NULL) follow the Hint/Name Table
+        dll_names = [_ascii(dll) + b'\0' for dll, _ in items]
+        dll_name_offsets = accumulate(
+            map(len, dll_names),
+            initial=hint_name_offset + sum(map(len, hint_names))
+        )
         
-        # Create section
-        import_data = bytearray(size)
-        current_offset = 0
+        # Lookup tables: ordinal bit clear, RVA of the Hint/Name entry, NULL terminated
+        ilts = [
+            struct.pack(f'<{len(functions) + 1}Q', *(next(hint_name_rvas) for _ in functions), 0)
+            for _, functions in items
+        ]
+        
+        # Import Directory Table, NULL terminated
+        idt = [
+            _IMPORT_DESCRIPTOR.pack(
+                section_rva + ilt_offset,       # OriginalFirstThunk
+                0,                              # TimeDateStamp
+                0,                              # ForwarderChain
+                section_rva + dll_name_offset,  # Name
+                section_rva + iat_offset        # FirstThunk
+            )
+            for ilt_offset, iat_offset, dll_name_offset in zip(ilt_offsets, iat_offsets, dll_name_offsets)
+        ]
+        idt.append(bytes(_IMPORT_DESCRIPTOR.size))
         
-        # Import Directory Table
-        idt_offset = current_offset
-        current_offset += (len(self.imports) + 1) * 20
+        # The IAT starts out as a copy of the lookup tables
+        import_data = b''.join(idt + ilts + ilts + hint_names + dll_names)
         
-        # Import Lookup Tables
-        ilt_offsets = {}
-        for dll in self.imports:
-            ilt_offsets[dll] = current_offset
-            current_offset += (len(self.imports[dll]) + 1) * 8
-            
-        # Hint/Name Table
-        hint_name_offset = current_offset
-        current_offset = hint_name_offset
-        
-        # Write Hint/Name Table
-        name_rvas = {}
-        for dll, functions in self.imports.items():
-            name_rvas[dll] = {}
-            for func in functions:
-                name_rvas[dll][func] = current_offset - hint_name_offset
-                
-                # Hint (0 for now)
-                import_data[current_offset:current_offset+2] = struct.pack('<H', 0)
-                current_offset += 2
-                
-                # Function name
-                import_data[current_offset:current_offset+len(func)] = func.encode('ascii')
-                current_offset += len(func)
-                import_data[current_offset] = 0  # NULL terminator
-                current_offset += 1
-                
-        # Write Import Lookup Tables
-        for dll, functions in self.imports.items():
-            offset = ilt_offsets[dll]
-            for func in functions:
-                # Ordinal bit clear, RVA to Hint/Name
-                import_data[offset:offset+8] = struct.pack('<Q', name_rvas[dll][func])
-                offset += 8
-            # NULL terminator
-            import_data[offset:offset+8] = b'\0' * 8
-            
-        # Write Import Directory Table
-        offset = idt_offset
-        for dll, functions in self.imports.items():
-            # Import Directory Entry
-            struct.pack_into('<IIIII', import_data, offset,
-                ilt_offsets[dll],  # OriginalFirstThunk
-                0,                 # TimeDateStamp
-                0,                 # ForwarderChain
-                hint_name_offset,  # Name
-                ilt_offsets[dll]   # FirstThunk
-            )
-            offset += 20
-            
-        # NULL terminator
-        import_data[offset:offset+20] = b'\0' * 20
+        self._data_directories[IMAGE_DIRECTORY_ENTRY_IMPORT] = (section_rva, idt_size)
+        self._data_directories[IMAGE_DIRECTORY_ENTRY_IAT] = (section_rva + iat_offsets[0], hint_name_offset - iat_offsets[0])
         
         # Add section
-        self.sections.append(Section(
+        self.add_section(Section(
             name=".idata",
-            virtual_address=0x3000,  # After .text and .data
+            virtual_address=section_rva,
             virtual_size=len(import_data),
             raw_data_size=len(import_data),
             raw_data_ptr=0,  # Will be calculated later
             characteristics=0xC0000040,  # INITIALIZED_DATA|READ|WRITE
-            data=bytes(import_data)
+            data=import_data
         ))
         
     def _add_export_section(self):
@@ -368,44 +336,53 @@ class PEGenerator:
         if not self.exports:
             return
             
-        # Calculate required size
-        names_size = sum(len(name) + 1 for name in self.exports.keys())
-        export_data = bytearray(40 + len(self.exports) * 4 + names_size)
-        
-        # Export Directory Table
-        struct.pack_into('<IIIIIIII', export_data, 0,
-            0,                  # Characteristics
-            0,                  # TimeDateStamp 
-            0,                  # MajorVersion/MinorVersion
-            0,                  # Name RVA
-            1,                  # OrdinalBase
-            len(self.exports),  # NumberOfFunctions
-            len(self.exports),  # NumberOfNames
-            40                  # AddressOfFunctions
-        )
+        # The table pointers are RVAs, so place the section first
+        section_rva = self._next_virtual_address()
+        
+        # The loader binary-searches the name table, so names must be sorted
+        names = sorted(self.exports)
+        count = len(names)
+        
+        # Directory, then Address, Name Pointer and Ordinal tables, then the names
+        functions_offset = _EXPORT_DIRECTORY.size
+        name_pointers_offset = functions_offset + count * 4
+        ordinals_offset = name_pointers_offset + count * 4
+        strings_offset = ordinals_offset + count * 2
+        
+        name_strings = [_ascii(name) + b'\0' for name in names]
+        name_rvas = list(accumulate(map(len, name_strings), initial=section_rva + strings_offset))
+        
+        export_data = b''.join([
+            _EXPORT_DIRECTORY.pack(
+                0,                     # Characteristics
+                0,                     # TimeDateStamp
+                0,                     # MajorVersion
+                0,                     # MinorVersion
+                0,                     # Name RVA
+                1,                     # OrdinalBase
+                count,                 # NumberOfFunctions
+                count,                 # NumberOfNames
+                section_rva + functions_offset,      # AddressOfFunctions
+                section_rva + name_pointers_offset,  # AddressOfNames
+                section_rva + ordinals_offset        # AddressOfNameOrdinals
+            ),
+            struct.pack(f'<{count}I', *(self.exports[name] for name in names)),
+            struct.pack(f'<{count}I', *name_rvas[:count]),
+            struct.pack(f'<{count}H', *range(count)),
+            *name_strings
+        ])
+        
+        self._data_directories[IMAGE_DIRECTORY_ENTRY_EXPORT] = (section_rva, len(export_data))
         
-        # Function addresses
-        addr_offset = 40
-        for addr in self.exports.values():
-            struct.pack_into('<I', export_data, addr_offset, addr)
-            addr_offset += 4
-            
-        # Function names
-        name_offset = addr_offset + len(self.exports) * 4
-        for name in self.exports.keys():
-            name_bytes = name.encode('ascii') + b'\0'
-            export_data[name_offset:name_offset+len(name_bytes)] = name_bytes
-            name_offset += len(name_bytes)
-            
         # Add section
-        self.sections.append(Section(
+        self.add_section(Section(
             name=".edata",
-            virtual_address=0x4000,  # After .idata
+            virtual_address=section_rva,
             virtual_size=len(export_data),
             raw_data_size=len(export_data),
             raw_data_ptr=0,
             characteristics=0x40000040,  # INITIALIZED_DATA|READ
-            data=bytes(export_data)
+            data=export_data
         ))
         
     def _add_relocation_section(self):
@@ -413,61 +390,56 @@ class PEGenerator:
         if not self.relocations:
             return
             
-        # Group relocations by page
-        pages = {}
-        for rva in self.relocations:
-            page_rva = rva & ~0xFFF  # Page aligned address
-            if page_rva not in pages:
-                pages[page_rva] = []
-            pages[page_rva].append(rva & 0xFFF)  # Offset within page
-            
-        # Calculate size and create buffer
-        total_size = sum(8 + len(entries) * 2 for entries in pages.values())
-        reloc_data = bytearray(total_size)
-        
-        # Write relocation blocks
-        offset = 0
-        for page_rva, entries in pages.items():
-            # Block header
-            struct.pack_into('<II', reloc_data, offset,
+        # Sort so pages and entries are emitted in ascending RVA order
+        self.relocations.sort()
+        
+        rvas = [rva for rva, _ in self.relocations]
+        
+        # Entry words for every relocation (type 3 = HIGH_LOW, offset within page)
+        entries = array('H', [0x3000 | (rva & 0xFFF) for rva in rvas])
+        if sys.byteorder == 'big':
+            entries.byteswap()
+        entry_bytes = memoryview(entries).cast('B')
+        
+        # One block per page: header followed by that page's slice of entries.
+        # The RVAs are sorted, so each page ends where the next page begins.
+        blocks = []
+        start = 0
+        while start < len(rvas):
+            page_rva = rvas[start] & ~0xFFF
+            end = bisect_left(rvas, page_rva + 0x1000, start)
+            blocks.append(_RELOC_BLOCK_HEADER.pack(
                 page_rva,                    # Page RVA
-                8 + len(entries) * 2         # Block Size
-            )
-            offset += 8
+                8 + (end - start) * 2        # Block Size
+            ))
+            blocks.append(entry_bytes[start * 2:end * 2])
+            start = end
             
-            # Relocation entries (type 3 = HIGH_LOW)
-            for entry in entries:
-                struct.pack_into('<H', reloc_data, offset, 0x3000 | entry)
-                offset += 2
+        reloc_data = b''.join(blocks)
+        section_rva = self._next_virtual_address()
+        self._data_directories[IMAGE_DIRECTORY_ENTRY_BASERELOC] = (section_rva, len(reloc_data))
                 
         # Add section
-        self.sections.append(Section(
+        self.add_section(Section(
             name=".reloc",
-            virtual_address=0x5000,  # After .edata
+            virtual_address=section_rva,
             virtual_size=len(reloc_data),
             raw_data_size=len(reloc_data),
             raw_data_ptr=0,
             characteristics=0x42000040,  # INITIALIZED_DATA|DISCARDABLE|READ
-            data=bytes(reloc_data)
+            data=reloc_data
         ))
         
     def generate(self, output_file: Path, code: bytes, data: bytes):
         """Generates the PE file"""
         try:
-            # Check if we have required permissions
-            if os.name == 'nt':  # Windows
-                if not ctypes.windll.shell32.IsUserAnAdmin():
-                    logging.warning("Insufficient permissions. Requesting elevation...")
-                    # Restart process with admin privileges
-                    if not ctypes.windll.shell32.ShellExecuteW(
-                        None, "runas", sys.executable, " ".join(sys.argv), None, 1
-                    ):
-                        raise PermissionError("Failed to elevate privileges. Please run as administrator.")
-                    sys.exit(0)  # Terminate original process
-
             # Create output directory if it doesn't exist
             output_file.parent.mkdir(parents=True, exist_ok=True)
             
+            # Writing the file needs no elevation, only a writable directory
+            if not os.access(output_file.parent, os.W_OK):
+                raise PermissionError(f"Output directory is not writable: {output_file.parent}")
+            
             # Create sections
             text_section = Section(
                 name=".text",
@@ -489,51 +461,27 @@ class PEGenerator:
                 data=data
             )
             
-            self.sections = [text_section, data_section]
+            self.sections = []
+            self._data_directories = {}
+            self.add_section(text_section)
+            self.add_section(data_section)
+            self.entry_point = self.entry_point or 0x1000  # Default to the start of code
             
-            # Add import section if needed
-            if self.imports:
-                self._add_import_section()
-                
-            # Calculate offsets
-            current_offset = self._calculate_headers_size()
-            for section in self.sections:
-                # Align to 512 bytes
-                current_offset = (current_offset + 511) & ~511
-                section.raw_data_ptr = current_offset
-                current_offset += section.raw_data_size
-                
-            # Write PE file
-            with open(output_file, 'wb') as f:
-                # Write DOS header
-                self._write_dos_header(f)
-                
-                # Write NT headers
-                self.entry_point = 0x1000  # Entry point at start of code
-                self._write_nt_headers(f)
-                
-                # Write section headers
-                self._write_section_headers(f)
-                
-                # Write sections
-                for section in self.sections:
-                    # Go to section offset
-                    current_pos = f.tell()
-                    padding = section.raw_data_ptr - current_pos
-                    if padding > 0:
-                        f.write(bytes(padding))
-                        
-                    # Write section data
-                    f.write(section.data)
+            if os.environ.get("METAFORGE_PE_BACKEND") == "lief":
+                self._generate_lief(output_file)
+            else:
+                # Add import, export and relocation sections if needed
+                if self.imports:
+                    self._add_import_section()
+                if self.exports:
+                    self._add_export_section()
+                if self.relocations:
+                    self._add_relocation_section()
                     
-                    # Padding at end of section
-                    end_padding = ((section.raw_data_size + 511) & ~511) - section.raw_data_size
-                    if end_padding > 0:
-                        f.write(bytes(end_padding))
-                        
-                # Ensure everything is written
-                f.flush()
-                os.fsync(f.fileno())
+                # Calculate offsets
+                self._finalize_layout()
+                
+                self._write_image(output_file)
                 
             # Verify file was created correctly
             if not output_file.exists():
@@ -555,133 +503,192 @@ class PEGenerator:
                 pass
             raise
         
+    def _write_image(self, output_file: Path):
+        """Writes the laid-out image in one pass with the built-in serializer"""
+        # Map the file at its final size; ftruncate zero-fills the padding.
+        # A raw descriptor is enough here, no buffered file object needed.
+        fd = os.open(output_file, _OUTPUT_FLAGS, 0o755)
+        try:
+            os.ftruncate(fd, self._file_size)
+            with mmap.mmap(fd, self._file_size, access=mmap.ACCESS_WRITE) as image:
+                # Headers
+                nt_offset = self._write_dos_header(image, 0)
+                offset = self._write_nt_headers(image, nt_offset)
+                self._write_section_headers(image, offset)
+                
+                # Section data
+                for section in self.sections:
+                    image[section.raw_data_ptr:section.raw_data_ptr + len(section.data)] = section.data
+                    
+                # The checksum covers the finished file, so patch it in place last
+                checksum_offset = nt_offset + _NT_OFFSET_CHECKSUM
+                _U32.pack_into(image, checksum_offset, self._compute_checksum(image, checksum_offset))
+                
+                # Ensure everything is written
+                image.flush()
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+            
+    def _compute_checksum(self, image: WritableBuffer, checksum_offset: int) -> int:
+        """Computes the PE image checksum, treating the CheckSum field as zero"""
+        # Read the image as one little-endian integer: since 0x10000 == 1 (mod 0xFFFF),
+        # reducing it mod 0xFFFF gives the sum of its 16-bit words with the carries
+        # folded back in, computed by CPython's bignum code instead of a word loop
+        checksum_field = int.from_bytes(image[checksum_offset:checksum_offset + 4], 'little')
+        total = int.from_bytes(image, 'little') - (checksum_field << (8 * checksum_offset))
+        
+        # A non-zero sum folds to 0xFFFF, not 0, when it is a multiple of 0xFFFF
+        checksum = total % 0xFFFF or (0xFFFF if total else 0)
+        
+        return checksum + len(image)
+        
+    @staticmethod
+    def _check_lief():
+        """Ensures a LIEF release with the supported PE builder API is installed"""
+        if lief is None:
+            raise RuntimeError("METAFORGE_PE_BACKEND=lief requires LIEF: pip install 'lief>=0.15,<0.16'")
+            
+        version = tuple(int(part) for part in lief.__version__.split('-')[0].split('.')[:2])
+        low, high = _LIEF_VERSIONS
+        if not low <= version < high:
+            raise RuntimeError(f"Unsupported LIEF version {lief.__version__}: "
+                               f"the LIEF backend requires lief>={low[0]}.{low[1]},<{high[0]}.{high[1]}")
+            
+    def _generate_lief(self, output_file: Path):
+        """Builds and writes the image with LIEF's native PE builder"""
+        self._check_lief()
+        
+        # The LIEF path only lays out sections and imports
+        if self.exports:
+            raise ValueError("The LIEF backend does not support exports")
+        if self.relocations:
+            raise ValueError("The LIEF backend does not support relocations")
+            
+        binary = lief.PE.Binary(lief.PE.PE_TYPE.PE32_PLUS)
+        
+        for section in self.sections:
+            pe_section = lief.PE.Section(section.name)
+            pe_section.content = list(section.data)
+            pe_section.characteristics = section.characteristics
+            binary.add_section(pe_section)
+            
+        # LIEF lays out the import table itself
+        for dll, functions in sorted(self.imports.items()):
+            library = binary.add_library(dll)
+            for function in sorted(functions):
+                library.add_entry(function)
+                
+        binary.optional_header.addressof_entrypoint = self.entry_point
+        
+        builder = lief.PE.Builder(binary)
+        builder.build_imports(True)
+        builder.build()
+        builder.write(str(output_file))
+        
+        self._verify_lief(output_file)
+        
+    def _verify_lief(self, output_file: Path):
+        """Re-parses the LIEF output and checks it holds every section and import"""
+        written = lief.parse(str(output_file))
+        if written is None:
+            raise RuntimeError(f"LIEF wrote an unreadable image: {output_file}")
+            
+        names = {section.name for section in written.sections}
+        missing = [section.name for section in self.sections if section.name not in names]
+        if missing:
+            raise RuntimeError(f"LIEF dropped sections: {', '.join(missing)}")
+            
+        imported = {(library.name.lower(), entry.name)
+                    for library in written.imports for entry in library.entries}
+        missing = [f"{dll}!{function}" for dll, functions in sorted(self.imports.items())
+                   for function in sorted(functions) if (dll.lower(), function) not in imported]
+        if missing:
+            raise RuntimeError(f"LIEF dropped imports: {', '.join(missing)}")
+            
+    def _finalize_layout(self):
+        """Assigns file offsets to the sections and caches the sizes the headers need"""
+        self._headers_size = self._calculate_headers_size()
+        
+        # Both alignments are powers of two, so align up with a mask
+        file_mask = IMAGE_FILE_ALIGNMENT - 1
+        file_offset = self._headers_size
+        image_size = 0
+        code_size = 0
+        initialized_data_size = 0
+        for section in self.sections:
+            # Align raw data to 512 bytes
+            section.raw_data_ptr = (file_offset + file_mask) & ~file_mask
+            file_offset = section.raw_data_ptr + section.raw_data_size
+            
+            image_size = max(image_size, section.virtual_address + section.virtual_size)
+            if section.characteristics & 0x20:
+                code_size += section.raw_data_size
+            if section.characteristics & 0x40:
+                initialized_data_size += section.raw_data_size
+                
+        self._file_size = file_offset
+        self._image_size = self._align_up(image_size, IMAGE_SECTION_ALIGNMENT)
+        self._code_size = code_size
+        self._initialized_data_size = initialized_data_size
+        
     def _calculate_headers_size(self) -> int:
         """Calculates total size of headers"""
         size = 0
-        size += 0x40  # DOS header
+        size += 0x80  # DOS header and stub
         size += 0x4   # PE signature
         size += 0x14  # File header
         size += 0xF0  # Optional header
         size += len(self.sections) * 0x28  # Section headers
         return (size + 511) & ~511  # Align to 512 bytes
         
-    def _write_dos_header(self, f: BinaryIO):
-        """Writes the DOS header"""
-        # DOS Header magic (MZ)
-        f.write(struct.pack('<H', IMAGE_DOS_SIGNATURE))
-        
-        # DOS Header stub program
-        dos_stub = bytes([
-            0x0E, 0x1F, 0xBA, 0x0E, 0x00, 0xB4, 0x09, 0xCD,
-            0x21, 0xB8, 0x01, 0x4C, 0xCD, 0x21, 0x54, 0x68,
-            0x69, 0x73, 0x20, 0x70, 0x72, 0x6F, 0x67, 0x72,
-            0x61, 0x6D, 0x20, 0x63, 0x61, 0x6E, 0x6E, 0x6F,
-            0x74, 0x20, 0x62, 0x65, 0x20, 0x72, 0x75, 0x6E,
-            0x20, 0x69, 0x6E, 0x20, 0x44, 0x4F, 0x53, 0x20,
-            0x6D, 0x6F, 0x64, 0x65, 0x2E, 0x0D, 0x0D, 0x0A,
-            0x24, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
-        ])
-        f.write(dos_stub)
-        
-        # PE Header offset
-        f.write(struct.pack('<I', 0x80))  # e_lfanew
-        
-    def _write_nt_headers(self, f: BinaryIO):
-        """Writes the NT headers"""
-        # PE Signature
-        f.write(struct.pack('<I', IMAGE_NT_SIGNATURE))
+    def _write_dos_header(self, buf: WritableBuffer, offset: int) -> int:
+        """Writes the DOS header, returns the offset just past it"""
+        buf[offset:offset + len(_DOS_HEADER)] = _DOS_HEADER
+        return offset + len(_DOS_HEADER)
+        
+    def _directory_entries(self) -> Tuple[int, ...]:
+        """Flattens the data directories into RVA, Size pairs for all 16 entries"""
+        entries = [0] * (IMAGE_NUMBEROF_DIRECTORY_ENTRIES * 2)
+        for index, (rva, size) in self._data_directories.items():
+            entries[2 * index:2 * index + 2] = rva, size
+        return tuple(entries)
+        
+    def _write_nt_headers(self, buf: WritableBuffer, offset: int) -> int:
+        """Writes the NT headers, returns the offset just past them"""
+        buf[offset:offset + _NT_HEADERS.size] = _nt_headers_template(
+            self.machine,
+            self.characteristics,
+            self.subsystem,
+            len(self.sections),
+            self._headers_size,
+            self.image_base,
+            self._directory_entries()
+        )
         
-        # File Header
-        f.write(struct.pack('<H', IMAGE_FILE_MACHINE_AMD64))  # Machine
-        f.write(struct.pack('<H', len(self.sections)))        # NumberOfSections
-        f.write(struct.pack('<I', 0))                         # TimeDateStamp
-        f.write(struct.pack('<I', 0))                         # PointerToSymbolTable
-        f.write(struct.pack('<I', 0))                         # NumberOfSymbols
-        f.write(struct.pack('<H', 0xF0))                      # SizeOfOptionalHeader
-        f.write(struct.pack('<H', IMAGE_FILE_EXECUTABLE_IMAGE | IMAGE_FILE_LARGE_ADDRESS_AWARE))  # Characteristics
+        # Patch the fields that vary between images
+        _U32.pack_into(buf, offset + _NT_OFFSET_SIZE_OF_CODE, self._code_size)
+        _U32.pack_into(buf, offset + _NT_OFFSET_SIZE_OF_INITIALIZED_DATA, self._initialized_data_size)
+        _U32.pack_into(buf, offset + _NT_OFFSET_ENTRY_POINT, self.entry_point)
+        _U32.pack_into(buf, offset + _NT_OFFSET_SIZE_OF_IMAGE, self._image_size)
         
-        # Optional Header
-        f.write(struct.pack('<H', 0x20B))  # Magic (PE32+)
-        f.write(struct.pack('<B', 1))      # MajorLinkerVersion
-        f.write(struct.pack('<B', 0))      # MinorLinkerVersion
-        f.write(struct.pack('<I', sum(s.raw_data_size for s in self.sections if s.characteristics & 0x20)))  # SizeOfCode
-        f.write(struct.pack('<I', sum(s.raw_data_size for s in self.sections if s.characteristics & 0x40)))  # SizeOfInitializedData
-        f.write(struct.pack('<I', 0))      # SizeOfUninitializedData
-        f.write(struct.pack('<I', self.entry_point))  # AddressOfEntryPoint
-        f.write(struct.pack('<I', 0x1000)) # BaseOfCode
-        
-        # PE32+ specific
-        f.write(struct.pack('<Q', 0x140000000))  # ImageBase
-        f.write(struct.pack('<I', 0x1000))       # SectionAlignment
-        f.write(struct.pack('<I', 0x200))        # FileAlignment
-        f.write(struct.pack('<H', 6))            # MajorOperatingSystemVersion
-        f.write(struct.pack('<H', 0))            # MinorOperatingSystemVersion
-        f.write(struct.pack('<H', 0))            # MajorImageVersion
-        f.write(struct.pack('<H', 0))            # MinorImageVersion
-        f.write(struct.pack('<H', 6))            # MajorSubsystemVersion
-        f.write(struct.pack('<H', 0))            # MinorSubsystemVersion
-        f.write(struct.pack('<I', 0))            # Win32VersionValue
-        f.write(struct.pack('<I', self._calculate_image_size()))  # SizeOfImage
-        f.write(struct.pack('<I', self._calculate_headers_size()))# SizeOfHeaders
-        f.write(struct.pack('<I', 0))            # CheckSum
-        f.write(struct.pack('<H', IMAGE_SUBSYSTEM_WINDOWS_CUI))  # Subsystem
-        f.write(struct.pack('<H', 0x8160))       # DllCharacteristics
-        f.write(struct.pack('<Q', 0x100000))     # SizeOfStackReserve
-        f.write(struct.pack('<Q', 0x1000))       # SizeOfStackCommit
-        f.write(struct.pack('<Q', 0x100000))     # SizeOfHeapReserve
-        f.write(struct.pack('<Q', 0x1000))       # SizeOfHeapCommit
-        f.write(struct.pack('<I', 0))            # LoaderFlags
-        f.write(struct.pack('<I', 16))           # NumberOfRvaAndSizes
-        
-        # Data Directories
-        for i in range(16):
-            if i == 1 and self.imports:  # Import Directory
-                f.write(struct.pack('<I', 0x3000))  # RVA
-                f.write(struct.pack('<I', 0x100))   # Size
-            else:
-                f.write(struct.pack('<Q', 0))       # Empty directory
+        return offset + _NT_HEADERS.size
                 
-    def _write_section_headers(self, f: BinaryIO):
-        """Writes the section headers"""
+    def _write_section_headers(self, buf: WritableBuffer, offset: int) -> int:
+        """Writes the section headers, returns the offset just past them"""
         for section in self.sections:
-            name = section.name.encode('ascii')[:8].ljust(8, b'\0')
-            f.write(name)  # Name
-            f.write(struct.pack('<I', section.virtual_size))      # VirtualSize
-            f.write(struct.pack('<I', section.virtual_address))   # VirtualAddress
-            f.write(struct.pack('<I', section.raw_data_size))    # SizeOfRawData
-            f.write(struct.pack('<I', section.raw_data_ptr))     # PointerToRawData
-            f.write(struct.pack('<I', 0))                        # PointerToRelocations
-            f.write(struct.pack('<I', 0))                        # PointerToLinenumbers
-            f.write(struct.pack('<H', 0))                        # NumberOfRelocations
-            f.write(struct.pack('<H', 0))                        # NumberOfLinenumbers
-            f.write(struct.pack('<I', section.characteristics))  # Characteristics
-            
-    def _write_import_directory(self, f: BinaryIO):
-        """Writes the import directory"""
-        # Import Directory Table
-        for dll_name, functions in self.imports.items():
-            # Import Directory Entry
-            f.write(struct.pack('<I', 0))  # OriginalFirstThunk
-            f.write(struct.pack('<I', 0))  # TimeDateStamp
-            f.write(struct.pack('<I', 0))  # ForwarderChain
-            f.write(struct.pack('<I', 0))  # Name RVA
-            f.write(struct.pack('<I', 0))  # FirstThunk
-            
-            # Import Lookup Table
-            for func_name in functions:
-                f.write(struct.pack('<Q', 0))  # Hint/Name RVA
-                
-            # NULL terminator
-            f.write(struct.pack('<Q', 0))
+            _SECTION_HEADER.pack_into(buf, offset,
+                _ascii(section.name),          # Name (truncated/padded to 8 bytes)
+                section.virtual_size,          # VirtualSize
+                section.virtual_address,       # VirtualAddress
+                section.raw_data_size,         # SizeOfRawData
+                section.raw_data_ptr,          # PointerToRawData
+                0,                             # PointerToRelocations
+                0,                             # PointerToLinenumbers
+                0,                             # NumberOfRelocations
+                0,                             # NumberOfLinenumbers
+                section.characteristics        # Characteristics
+            )
+            offset += _SECTION_HEADER.size
             
-        # NULL terminator for Import Directory
-        f.write(bytes(20))
-        
-    def _calculate_image_size(self) -> int:
-        """Calculates total size of image in memory"""
-        size = 0
-        for section in self.sections:
-            section_end = section.virtual_address + section.virtual_size
-            if section_end > size:
-                size = section_end
-        return (size + 0xFFF) & ~0xFFF  # Align to 4KB
\ No newline at end of file
+        return offset
@@ -47,6 +47,12 @@ import struct
 import os
 import subprocess
 from enum import Enum
+from itertools import accumulate
+
+# SFO header: magic, version, key table start, data table start, entry count
+_SFO_HEADER = struct.Struct('<4sIIII')
+# SFO index entry: key offset, data format, length, max length, data offset
+_SFO_INDEX_ENTRY = struct.Struct('<HHIII')
 
 class PSExecutableType(Enum):
     PRX = "prx"    # PlayStation Relocatable Executable
@@ -80,6 +86,8 @@ class PlayStationBackend(CompilerBackend):
         super().__init__(options)
         self.sdk_path = self._find_playstation_sdk()
         self.toolchain = self._setup_toolchain()
+        self._compile_cmd: Optional[List[str]] = None  # Built on first compile
+        self._compile_cmd_key: Optional[tuple] = None  # Options the cached command was built from
         
     def _find_playstation_sdk(self) -> Optional[Path]:
         """Finds installed PlayStation SDK"""
@@ -111,6 +119,36 @@ class PlayStationBackend(CompilerBackend):
             'includes': self.sdk_path / "target/include"
         }
         
+    def _build_compile_command(self) -> List[str]:
+        """Builds the orbis-clang arguments shared by every compile"""
+        cmd = [
+            str(self.toolchain['compiler']),
+            '-target', 'x86_64-scei-ps4' if self.options.architecture == Architecture.X64 else 'aarch64-scei-ps5',
+            '-fPIC',
+            '-O2',
+            '-I', str(self.toolchain['includes'])
+        ]
+        
+        if self.options.debug_info:
+            cmd.append('-g')
+            
+        # Add PlayStation libraries; compile and link happen in the same driver call
+        cmd.extend([
+            '-L', str(self.toolchain['libs']),
+            '-lSceLibc',
+            '-lSceSystemService',
+            '-lSceUserService'
+        ])
+        return cmd
+        
+    def _get_compile_command(self) -> List[str]:
+        """Returns the cached orbis-clang arguments, rebuilt if the options changed"""
+        key = (self.options.architecture, self.options.debug_info)
+        if self._compile_cmd is None or self._compile_cmd_key != key:
+            self._compile_cmd = self._build_compile_command()
+            self._compile_cmd_key = key
+        return self._compile_cmd
+        
     def compile(self, ir: Dict, output_file: Path) -> bool:
         try:
             # Generate sections
@@ -148,26 +186,7 @@ class PlayStationBackend(CompilerBackend):
         """Generates base ELF file"""
         try:
             # Compile using orbis-clang
-            cmd = [
-                str(self.toolchain['compiler']),
-                '-target', 'x86_64-scei-ps4' if self.options.architecture == Architecture.X64 else 'aarch64-scei-ps5',
-                '-fPIC',
-                '-O2',
-                '-I', str(self.toolchain['includes']),
-                '-o', str(output)
-            ]
-            
-            if self.options.debug_info:
-                cmd.append('-g')
-                
-            # Add PlayStation libraries
-            cmd.extend([
-                '-L', str(self.toolchain['libs']),
-                '-lSceLibc',
-                '-lSceSystemService',
-                '-lSceUserService'
-            ])
-            
+            cmd = self._get_compile_command() + ['-o', str(output)]
             return subprocess.run(cmd, check=True).returncode == 0
             
         except Exception as e:
@@ -232,44 +251,40 @@ class PlayStationBackend(CompilerBackend):
             'VERSION': '01.00'
         }
         
-        # Write SFO header
-        with open(output, 'wb') as f:
-            # Magic "\0PSF"
-            f.write(b'\0PSF')
-            # Version 1.1
-            f.write(struct.pack('<I', 0x101))
-            # Key table start
-            key_table_start = 20
-            f.write(struct.pack('<I', key_table_start))
-            # Data table start 
-            data_table_start = key_table_start + sum(len(k) + 1 for k in sfo_data.keys())
-            f.write(struct.pack('<I', data_table_start))
-            # Number of entries
-            f.write(struct.pack('<I', len(sfo_data)))
+        keys = [key.encode('utf-8') + b'\0' for key in sfo_data]
+        values = [value.encode('utf-8') + b'\0' for value in sfo_data.values()]  # UTF-8, NULL terminated
+        key_offsets = list(accumulate(map(len, keys), initial=0))
+        data_offsets = list(accumulate(map(len, values), initial=0))
+        
+        # Header, index table, key table (padded to 4 bytes), data table
+        key_table_start = _SFO_HEADER.size + len(sfo_data) * _SFO_INDEX_ENTRY.size
+        data_table_start = (key_table_start + key_offsets[-1] + 3) & ~3
+        buf = bytearray(data_table_start + data_offsets[-1])
+        
+        _SFO_HEADER.pack_into(
+            buf, 0,
+            b'\0PSF',          # Magic
+            0x101,             # Version 1.1
+            key_table_start,
+            data_table_start,
+            len(sfo_data)      # Number of entries
+        )
+        
+        for i, value in enumerate(values):
+            _SFO_INDEX_ENTRY.pack_into(
+                buf, _SFO_HEADER.size + i * _SFO_INDEX_ENTRY.size,
+                key_offsets[i],   # Key offset
+                0x0204,           # Data format (UTF-8 string)
+                len(value),       # Length of value
+                len(value),       # Max length (same as length for fixed strings)
+                data_offsets[i]   # Data offset
+            )
             
-            # Write key table
-            offset = 0
-            for key in sfo_data.keys():
-                # Key offset
-                f.write(struct.pack('<H', offset))
-                # Data format (UTF-8 string)
-                f.write(struct.pack('<H', 0x0204))
-                # Length of value
-                f.write(struct.pack('<I', len(sfo_data[key])))
-                # Max length (same as length for fixed strings)
-                f.write(struct.pack('<I', len(sfo_data[key])))
-                # Data offset
-                f.write(struct.pack('<I', offset))
-                
-                offset += len(sfo_data[key])
-                
-            # Write keys
-            for key in sfo_data.keys():
-                f.write(key.encode('utf-8') + b'\0')
-                
-            # Write values
-            for value in sfo_data.values():
-                f.write(value.encode('utf-8'))
+        buf[key_table_start:key_table_start + key_offsets[-1]] = b''.join(keys)
+        buf[data_table_start:] = b''.join(values)
+        
+        with open(output, 'wb') as f:
+            f.write(buf)
         
     def supports_platform(self, platform: Platform) -> bool:
         return platform == Platform.PLAYSTATION
@@ -41,10 +41,13 @@
 # It can be extended to support more advanced register allocation techniques.
 #
 # ---------------------------------------------------------------------------------
+from collections import OrderedDict, deque
+from operator import itemgetter
 from enum import Enum
 from typing import Dict, Set, List, Optional
-from dataclasses import dataclass
-import networkx as nx
+from dataclasses import dataclass, replace
+import hashlib
+import pickle
 
 class Register(Enum):
     # Caller-saved registers
@@ -77,12 +80,26 @@ class LiveRange:
     reg: Optional[Register] = None  # Allocated register
     spill: bool = False  # True if variable is spilled to memory
 
+@dataclass(frozen=True, slots=True)
+class MemOp:
+    """Memory operand at a constant offset from a base register"""
+    offset: int         # Byte offset from base, negative for stack slots
+    base: str = "rbp"   # Base register
+    
+    def __str__(self) -> str:
+        # Formatted only when the assembly text is emitted
+        return f"[{self.base}{self.offset:+d}]"
+
+# Number of allocation results kept per allocator, keyed by IR fingerprint
+ALLOCATION_CACHE_SIZE = 256
+
 class RegisterAllocator:
     def __init__(self):
         self.live_ranges: List[LiveRange] = []
-        self.interference_graph = nx.Graph()
+        self.adj: Dict[str, Set[str]] = {}  # Interference graph as adjacency sets
         self.coloring: Dict[str, Register] = {}
         self.spilled_vars: Set[str] = set()
+        self._cache: OrderedDict = OrderedDict()  # fingerprint -> (coloring, spilled_vars, live_ranges, adj)
         
         # Available registers for allocation
         self.available_regs = [
@@ -95,6 +112,20 @@ class RegisterAllocator:
     def allocate_registers(self, ir_function: Dict) -> Dict[str, Register]:
         """Allocates registers for a function using graph coloring"""
         
+        # Reuse the result of an earlier run on identical IR
+        key = self._fingerprint(ir_function)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            coloring, spilled_vars, live_ranges, adj = cached
+            self.coloring = dict(coloring)
+            self.spilled_vars = set(spilled_vars)
+            self.live_ranges = [replace(lr) for lr in live_ranges]
+            self.adj = {temp: set(neighbors) for temp, neighbors in adj.items()}
+            if self.spilled_vars:
+                self._handle_spills(ir_function)
+            return self.coloring
+        
         # Calculate live ranges
         self._compute_live_ranges(ir_function)
         
@@ -104,15 +135,30 @@ class RegisterAllocator:
         # Color the graph
         self._color_graph()
         
+        self._cache[key] = (
+            dict(self.coloring),
+            frozenset(self.spilled_vars),
+            tuple(replace(lr) for lr in self.live_ranges),
+            {temp: frozenset(neighbors) for temp, neighbors in self.adj.items()}
+        )
+        if len(self._cache) > ALLOCATION_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        
         # Handle spilled variables
         if self.spilled_vars:
             self._handle_spills(ir_function)
             
         return self.coloring
         
+    def _fingerprint(self, ir_function: Dict) -> bytes:
+        """Hashes the instructions of a function, before spill rewriting"""
+        blocks = [block['instructions'] for block in ir_function['blocks']]
+        return hashlib.blake2b(pickle.dumps(blocks, protocol=5), digest_size=16).digest()
+        
     def _compute_live_ranges(self, ir_function: Dict):
         """Computes live ranges for each variable"""
         self.live_ranges.clear()
+        ranges_by_temp: Dict[str, LiveRange] = {}
         
         # Liveness analysis for each block
         for block in ir_function['blocks']:
@@ -122,48 +168,58 @@ class RegisterAllocator:
             for i, instr in enumerate(reversed(block['instructions'])):
                 curr_idx = len(block['instructions']) - i - 1
                 
-                # Add definitions
-                if 'dest' in instr:
-                    live_range = LiveRange(
-                        start=curr_idx,
-                        end=curr_idx,
-                        temp=instr['dest']
-                    )
-                    self.live_ranges.append(live_range)
-                    live_vars.discard(instr['dest'])
+                # Add definitions (spill stores write a MemOp, not a temporary)
+                dest = instr.get('dest')
+                if isinstance(dest, str):
+                    self._extend_live_range(ranges_by_temp, dest, curr_idx)
+                    live_vars.discard(dest)
                     
                 # Add uses
                 for op in ['src1', 'src2']:
                     if op in instr and isinstance(instr[op], str):
                         live_vars.add(instr[op])
-                        # Extend existing live range or create new one
-                        found = False
-                        for lr in self.live_ranges:
-                            if lr.temp == instr[op]:
-                                lr.start = min(lr.start, curr_idx)
-                                lr.end = max(lr.end, curr_idx)
-                                found = True
-                                break
-                        if not found:
-                            self.live_ranges.append(LiveRange(
-                                start=curr_idx,
-                                end=curr_idx,
-                                temp=instr[op]
-                            ))
-                            
+                        self._extend_live_range(ranges_by_temp, instr[op], curr_idx)
+                        
+    def _extend_live_range(self, ranges_by_temp: Dict[str, LiveRange], temp: str, idx: int):
+        """Extends the live range of temp to cover idx, creating it if needed"""
+        live_range = ranges_by_temp.get(temp)
+        if live_range is None:
+            live_range = LiveRange(start=idx, end=idx, temp=temp)
+            ranges_by_temp[temp] = live_range
+            self.live_ranges.append(live_range)
+        else:
+            live_range.start = min(live_range.start, idx)
+            live_range.end = max(live_range.end, idx)
+            
     def _build_interference_graph(self):
         """Builds the interference graph"""
-        self.interference_graph.clear()
+        adj = self.adj
+        adj.clear()
         
         # Add nodes for each variable
         for lr in self.live_ranges:
-            self.interference_graph.add_node(lr.temp)
-            
-        # Add edges for overlapping live ranges
-        for i, lr1 in enumerate(self.live_ranges):
-            for lr2 in self.live_ranges[i+1:]:
-                if (lr1.start <= lr2.end and lr2.start <= lr1.end):
-                    self.interference_graph.add_edge(lr1.temp, lr2.temp)
+            adj[lr.temp] = set()
+        
+        # Sweep over range boundaries. A range ends just after its last
+        # instruction; at equal positions ends sort before starts (0 < 1),
+        # so ranges that merely touch don't interfere. The key stops before
+        # the operand, which need not be orderable.
+        events = []
+        for lr in self.live_ranges:
+            events.append((lr.start, 1, lr.temp))
+            events.append((lr.end + 1, 0, lr.temp))
+        events.sort(key=itemgetter(0, 1))
+        
+        # Each starting range interferes with every range still active
+        active = set()
+        for _, is_start, temp in events:
+            if is_start:
+                adj[temp].update(active)
+                for other in active:
+                    adj[other].add(temp)
+                active.add(temp)
+            else:
+                active.discard(temp)
                     
     def _color_graph(self):
         """Colors the graph using Chaitin's algorithm"""
@@ -172,81 +228,79 @@ class RegisterAllocator:
         
         # Stack for coloring
         stack = []
-        graph = self.interference_graph.copy()
+        graph = {node: set(neighbors) for node, neighbors in self.adj.items()}
+        num_regs = len(self.available_regs)
         
-        # Simplification: remove nodes with degree < number of registers
+        # Simplification: remove nodes with degree < number of registers.
+        # Nodes join the worklist once, when their degree drops below it.
+        low_degree = deque(node for node, neighbors in graph.items() if len(neighbors) < num_regs)
         while graph:
-            spill_candidate = None
-            min_degree = float('inf')
-            
-            for node in graph.nodes():
-                degree = graph.degree(node)
-                if degree < len(self.available_regs):
-                    stack.append((node, set(graph.neighbors(node))))
-                    graph.remove_node(node)
-                    break
-                elif degree < min_degree:
-                    spill_candidate = node
-                    min_degree = degree
+            if low_degree:
+                node = low_degree.popleft()
+                neighbors = graph.pop(node)
+                stack.append((node, neighbors))
             else:
-                if spill_candidate:
-                    self.spilled_vars.add(spill_candidate)
-                    graph.remove_node(spill_candidate)
-                else:
-                    break
+                # Every remaining node is significant: spill the one of highest degree
+                node = max(graph, key=lambda n: len(graph[n]))
+                neighbors = graph.pop(node)
+                self.spilled_vars.add(node)
+                
+            for neighbor in neighbors:
+                remaining = graph[neighbor]
+                remaining.discard(node)
+                if len(remaining) == num_regs - 1:
+                    low_degree.append(neighbor)
                     
-        # Color the nodes
-        used_colors = set()
+        # Color the nodes; used colors are a bitmask over available_regs
+        reg_index = {reg: i for i, reg in enumerate(self.available_regs)}
+        all_colors = (1 << len(self.available_regs)) - 1
         while stack:
             node, neighbors = stack.pop()
             
-            # Find first available color
-            used_colors.clear()
+            used_mask = 0
             for neighbor in neighbors:
-                if neighbor in self.coloring:
-                    used_colors.add(self.coloring[neighbor])
+                reg = self.coloring.get(neighbor)
+                if reg is not None:
+                    used_mask |= 1 << reg_index[reg]
                     
-            for reg in self.available_regs:
-                if reg not in used_colors:
-                    self.coloring[node] = reg
-                    break
+            # Lowest clear bit is the first available color
+            free_mask = ~used_mask & all_colors
+            if free_mask:
+                self.coloring[node] = self.available_regs[(free_mask & -free_mask).bit_length() - 1]
             else:
                 self.spilled_vars.add(node)
                 
     def _handle_spills(self, ir_function: Dict):
         """Handles spilled variables by allocating stack space"""
-        stack_offset = 0
-        spill_locations = {}
-        
         # Allocate stack space for each spilled variable
-        for var in self.spilled_vars:
-            stack_offset += 8  # Assumes 8-byte variables
-            spill_locations[var] = stack_offset
-            
+        spill_addr = {
+            var: MemOp(offset=-8 * (i + 1))  # Assumes 8-byte variables
+            for i, var in enumerate(sorted(self.spilled_vars))
+        }
+        stack_offset = 8 * len(spill_addr)
+        
+        rax = Register.RAX.value
+        r11 = Register.R11.value
+        
         # Update instructions to use stack instead of registers
         for block in ir_function['blocks']:
             new_instructions = []
+            append = new_instructions.append
             
             for instr in block['instructions']:
-                if 'dest' in instr and instr['dest'] in self.spilled_vars:
+                dest_addr = spill_addr.get(instr.get('dest'))
+                if dest_addr is not None:
                     # Store result to stack
-                    new_instructions.append({
-                        'opcode': 'mov',
-                        'dest': f'[rbp-{spill_locations[instr["dest"]]}]',
-                        'src': Register.RAX.value
-                    })
+                    append({'opcode': 'mov', 'dest': dest_addr, 'src': rax})
                     
-                for op in ['src1', 'src2']:
-                    if op in instr and instr[op] in self.spilled_vars:
+                for op in ('src1', 'src2'):
+                    src_addr = spill_addr.get(instr.get(op))
+                    if src_addr is not None:
                         # Load from stack to temporary register
-                        new_instructions.append({
-                            'opcode': 'mov',
-                            'dest': Register.R11.value,
-                            'src': f'[rbp-{spill_locations[instr[op]]}]'
-                        })
-                        instr[op] = Register.R11.value
+                        append({'opcode': 'mov', 'dest': r11, 'src': src_addr})
+                        instr[op] = r11
                         
-                new_instructions.append(instr)
+                append(instr)
                 
             block['instructions'] = new_instructions
             
@@ -40,9 +40,16 @@
 # This module is used by the MetaForge compiler to generate assembly code from
 # the intermediate representation (IR). It can be extended to support
 # additional relocation types and target platforms.
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Set, Tuple
 from enum import Enum
+from array import array
+import struct
+import sys
+
+# Page RVA, Block Size
+_BLOCK_HEADER = struct.Struct('<II')
 
 class RelocationType(Enum):
     REL32 = 0   # 32-bit relative
@@ -56,62 +63,108 @@ class RelocationEntry:
     symbol: str     # Target symbol name
     addend: int = 0 # Value to add
 
+# Relocation type -> PE base relocation type; REL64 needs no base relocation
+_BASE_RELOCATION_TYPES = {
+    RelocationType.REL32: 0x3,  # IMAGE_REL_BASED_HIGHLOW
+    RelocationType.DIR64: 0xA,  # IMAGE_REL_BASED_DIR64
+}
+
 class RelocationBlock:
     def __init__(self, rva: int):
         self.rva = rva  # Base RVA of block
-        self.entries: List[tuple[int, int]] = []  # [(offset, type), ...]
+        self.entries = array('H')  # Encoded entries: type << 12 | page offset
+        self._seen: Set[int] = set()  # Encoded entries already in the block
+        self._serialized: Optional[bytes] = None  # Cached serialize() result
         
     def add_entry(self, offset: int, type: int):
-        self.entries.append((offset, type))
+        entry = (type << 12) | (offset & 0xFFF)
+        if entry in self._seen:
+            return
+        self._seen.add(entry)
+        self.entries.append(entry)
+        self._serialized = None
+        
+    def add_encoded_entries(self, entries: List[int]):
+        """Adds entries already encoded as type << 12 | page offset, skipping duplicates"""
+        seen = self._seen
+        new_entries = [entry for entry in dict.fromkeys(entries) if entry not in seen]
+        if new_entries:
+            seen.update(new_entries)
+            self.entries.extend(new_entries)
+            self._serialized = None
         
     def get_size(self) -> int:
         return 8 + len(self.entries) * 2  # Header + entries
         
     def serialize(self) -> bytes:
-        # Block header
-        data = bytearray()
-        data.extend(self.rva.to_bytes(4, 'little'))
-        data.extend(self.get_size().to_bytes(4, 'little'))
-        
-        # Entries
-        for offset, type in self.entries:
-            entry = (type << 12) | (offset & 0xFFF)
-            data.extend(entry.to_bytes(2, 'little'))
-            
-        return bytes(data)
+        if self._serialized is None:
+            entries = self.entries
+            if sys.byteorder == 'big':
+                entries = array('H', entries)
+                entries.byteswap()
+                
+            # Block header followed by the entries
+            self._serialized = _BLOCK_HEADER.pack(self.rva, self.get_size()) + entries.tobytes()
+        return self._serialized
 
 class RelocationTable:
     def __init__(self):
-        self.blocks: List[RelocationBlock] = []
+        self._blocks: List[RelocationBlock] = []
+        self._blocks_by_rva: Dict[int, RelocationBlock] = {}  # Block RVA -> block
+        self._sorted = True  # Whether _blocks is in RVA order
+        self._serialized: Optional[bytes] = None  # Cached serialize() result
+        
+    @property
+    def blocks(self) -> Tuple[RelocationBlock, ...]:
+        """Read-only view of the blocks in RVA order"""
+        self._sort_blocks()
+        return tuple(self._blocks)
         
     def add_relocation(self, rva: int, type: int):
         """Adds a relocation"""
-        # Find appropriate block
-        block_rva = rva & ~0xFFF  # Align to 4KB
-        block = self._find_block(block_rva)
-        if not block:
-            block = RelocationBlock(block_rva)
-            self.blocks.append(block)
-            
+        # Find appropriate block, aligned to 4KB
+        block = self._get_or_create_block(rva & ~0xFFF)
+        
         # Add the entry
         block.add_entry(rva & 0xFFF, type)
+        self._serialized = None
+        
+    def add_block(self, block_rva: int, entries: List[int]):
+        """Adds the encoded entries of one 4KB page with a single block lookup"""
+        block = self._get_or_create_block(block_rva)
+        block.add_encoded_entries(entries)
+        self._serialized = None
+        
+    def _get_or_create_block(self, page_rva: int) -> RelocationBlock:
+        """Returns the block for a 4KB page, appending a new one if needed"""
+        block = self._blocks_by_rva.get(page_rva)
+        if block is None:
+            block = RelocationBlock(page_rva)
+            self._blocks_by_rva[page_rva] = block
+            if self._blocks and self._blocks[-1].rva > page_rva:
+                self._sorted = False
+            self._blocks.append(block)
+        return block
         
     def _find_block(self, rva: int) -> RelocationBlock:
         """Finds block for an RVA"""
-        for block in self.blocks:
-            if block.rva == rva:
-                return block
-        return None
+        return self._blocks_by_rva.get(rva)
         
+    def _sort_blocks(self):
+        """Sorts the blocks by RVA, only when one was added out of order"""
+        if not self._sorted:
+            self._blocks.sort(key=lambda b: b.rva)
+            self._sorted = True
+            
     def serialize(self) -> bytes:
         """Serializes the relocation table"""
-        data = bytearray()
-        
-        # Write all blocks
-        for block in sorted(self.blocks, key=lambda b: b.rva):
-            data.extend(block.serialize())
+        # A block changed through its own add_entry drops its cache, so the table's is stale too
+        if self._serialized is None or any(block._serialized is None for block in self._blocks):
+            self._sort_blocks()
             
-        return bytes(data)
+            # Write all blocks
+            self._serialized = b''.join(block.serialize() for block in self._blocks)
+        return self._serialized
 
 class RelocationHandler:
     def __init__(self):
@@ -124,19 +177,20 @@ class RelocationHandler:
         
     def process_relocations(self, symbols: Dict[str, int]) -> RelocationTable:
         """Processes relocations and generates table"""
-        table = RelocationTable()
-        
+        # Validate every symbol up front
         for reloc in self.relocations:
             if reloc.symbol not in symbols:
                 raise Exception(f"Undefined symbol in relocation: {reloc.symbol}")
                 
-            target = symbols[reloc.symbol] + reloc.addend
-            
-            if reloc.type == RelocationType.REL32:
-                # 32-bit relative relocation
-                table.add_relocation(reloc.offset, 0x3)  # IMAGE_REL_BASED_HIGHLOW
-            elif reloc.type == RelocationType.DIR64:
-                # 64-bit direct relocation
-                table.add_relocation(reloc.offset, 0xA)  # IMAGE_REL_BASED_DIR64
+        # Bucket the encoded entries by 4KB page so each block is looked up once
+        buckets: Dict[int, List[int]] = defaultdict(list)
+        for reloc in self.relocations:
+            code = _BASE_RELOCATION_TYPES.get(reloc.type)
+            if code is not None:
+                buckets[reloc.offset & ~0xFFF].append((code << 12) | (reloc.offset & 0xFFF))
                 
-        return table
\ No newline at end of file
+        table = RelocationTable()
+        for block_rva in sorted(buckets):
+            table.add_block(block_rva, buckets[block_rva])
+            
+        return table
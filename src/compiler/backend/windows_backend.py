@@ -46,6 +46,18 @@ from .x64_assembler import X64Assembler, Register
 from .pe_generator import PEGenerator
 from .oop_generator import OOPGenerator, ClassInfo, MethodInfo
 
+# Standard Windows x64 frame with the 32-byte shadow space for callees
+_STD_PROLOG = bytes([
+    0x55,                    # push rbp
+    0x48, 0x89, 0xE5,        # mov rbp, rsp
+    0x48, 0x83, 0xEC, 0x20   # sub rsp, 32
+])
+_STD_EPILOG = bytes([
+    0x48, 0x83, 0xC4, 0x20,  # add rsp, 32
+    0x5D,                    # pop rbp
+    0xC3                     # ret
+])
+
 class WindowsBackend(CompilerBackend):
     def __init__(self, options: BackendOptions):
         super().__init__(options)
@@ -55,6 +67,7 @@ class WindowsBackend(CompilerBackend):
         self.current_class: Optional[ClassInfo] = None
         self.data_section = bytearray()
         self.bss_section = bytearray()
+        self.code = bytearray()  # Reused by _generate_code across compile() calls
         self.vtables: Dict[str, int] = {}  # Class name to vtable offset mapping
         self.static_areas: Dict[str, int] = {}  # Class name to static area offset mapping
 
@@ -72,9 +85,9 @@ class WindowsBackend(CompilerBackend):
             return False
 
         try:
-            # Initialize sections
-            self.data_section = bytearray()
-            self.bss_section = bytearray()
+            # Initialize sections, reusing the buffers of the previous compile
+            self.data_section.clear()
+            self.bss_section.clear()
             self.vtables.clear()
             self.static_areas.clear()
 
@@ -128,7 +141,8 @@ class WindowsBackend(CompilerBackend):
 
     def _generate_code(self, ir: Dict) -> bytearray:
         """Generate machine code from IR"""
-        code = bytearray()
+        code = self.code
+        code.clear()
         
         # Generate entry point
         if "main" in ir:
@@ -162,19 +176,19 @@ class WindowsBackend(CompilerBackend):
     def _generate_entry_point(self, code: bytearray) -> None:
         """Generate entry point code"""
         # Standard Windows x64 entry point
-        self.assembler.generate_prolog(code)
+        code.extend(_STD_PROLOG)
         self.assembler.mov(code, Register.RCX, Register.RCX)  # Preserve args
         self.assembler.call(code, "main")
-        self.assembler.generate_epilog(code)
+        code.extend(_STD_EPILOG)
 
     def _generate_method(self, code: bytearray, method: MethodInfo) -> None:
         """Generate code for a method"""
         # Method prolog
-        self.assembler.generate_prolog(code)
+        code.extend(_STD_PROLOG)
         
         # Generate method body
         for instruction in method.body:
             self.assembler.generate_instruction(code, instruction)
             
         # Method epilog
-        self.assembler.generate_epilog(code)
\ No newline at end of file
+        code.extend(_STD_EPILOG)
\ No newline at end of file
@@ -66,6 +66,86 @@ class Register(Enum):
     R13 = 13
     R14 = 14
     R15 = 15
+    
+    def __init__(self, value):
+        self.mnemonic = self.name.lower()  # Assembly spelling, e.g. 'r10'
+
+# Operand spelling -> Register, for both lowercase and uppercase names
+_REGISTERS: Dict[str, Register] = {
+    name: reg
+    for reg in Register
+    for name in (reg.name, reg.mnemonic)
+}
+
+def _reg_reg_table(opcode: int) -> tuple:
+    """Encodes 'opcode r/m64, r64' for every (dst, src) pair, indexed by dst << 4 | src"""
+    return tuple(
+        bytes((
+            0x48 | (0x04 if src >= 8 else 0) | (0x01 if dst >= 8 else 0),  # REX.W, R = src, B = dst
+            opcode,
+            0xC0 | ((src & 7) << 3) | (dst & 7)                           # ModRM: reg = src, rm = dst
+        ))
+        for dst in range(16)
+        for src in range(16)
+    )
+
+# Register-to-register encodings
+_MOV_RR = _reg_reg_table(0x89)
+_XOR_RR = _reg_reg_table(0x31)
+_ADD_RR = _reg_reg_table(0x01)
+_SUB_RR = _reg_reg_table(0x29)
+
+def _reg_op_table(opcode: int) -> tuple:
+    """Encodes 'opcode+r' for every register, with REX.B for r8-r15"""
+    return tuple(
+        bytes((0x41, opcode + (reg & 7))) if reg >= 8 else bytes((opcode + reg,))
+        for reg in range(16)
+    )
+
+# Single-register encodings, indexed by register number
+_PUSH_R = _reg_op_table(0x50)
+_POP_R = _reg_op_table(0x58)
+
+# 'call r64' encodings, indexed by register number
+_CALL_R = tuple(
+    bytes((0x41, 0xFF, 0xD0 + (reg & 7))) if reg >= 8 else bytes((0xFF, 0xD0 + reg))
+    for reg in range(16)
+)
+
+# 'mov r32, imm32' opcode bytes, indexed by register number
+_MOV_R32_IMM = _reg_op_table(0xB8)
+
+# 'xor r32, r32' zeroing idiom (clears the full 64-bit register), indexed by register number
+_ZERO_R = tuple(
+    bytes((0x45, 0x31, 0xC0 | ((reg & 7) << 3) | (reg & 7))) if reg >= 8
+    else bytes((0x31, 0xC0 | (reg << 3) | reg))
+    for reg in range(16)
+)
+
+# Immediate and displacement packers, built once instead of per call
+_S8 = struct.Struct('<b')
+_S32 = struct.Struct('<i')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+def _fits_imm8(value: int) -> bool:
+    return -0x80 <= value <= 0x7F
+
+def _fits_imm32(value: int) -> bool:
+    return -0x80000000 <= value <= 0x7FFFFFFF
+
+def _rex_w(reg: int, base: int) -> int:
+    """REX.W prefix with R for ModRM.reg and B for ModRM.rm / base"""
+    return 0x48 | (0x04 if reg >= 8 else 0) | (0x01 if base >= 8 else 0)
+
+def _modrm_disp(reg: int, base: int, disp: int) -> bytes:
+    """Encodes ModRM (+SIB) and displacement for [base + disp]"""
+    mod = 0x40 if _fits_imm8(disp) else 0x80  # disp8 / disp32, so rbp/r13 bases always work
+    encoded = bytes((mod | ((reg & 7) << 3) | (base & 7),))
+    if base & 7 == 4:
+        # rsp/r12 base needs a SIB byte
+        encoded += b'\x24'
+    return encoded + (_S8.pack(disp) if mod == 0x40 else _S32.pack(disp))
 
 class OperandType(Enum):
     REGISTER = "reg"
@@ -78,177 +158,258 @@ class Operand:
     type: OperandType
     value: Union[Register, int, str, Dict]
 
+@dataclass(frozen=True, slots=True)
+class AsmInstr:
+    """An instruction to assemble"""
+    opcode: str
+    operands: tuple = ()           # Registers, immediates, '[base + disp]' or '[label]'
+    target: Optional[str] = None   # Label operand of a direct call
+
+@dataclass(frozen=True, slots=True)
+class AsmLabel:
+    """Marks the position of a label in the instruction stream"""
+    name: str
+
+# Longest encoding the emitters produce (REX + C7 + ModRM + SIB + disp32 + imm32)
+MAX_INSTRUCTION_SIZE = 12
+
+# Encodings of label-free instructions, shared by all assemblers (FIFO bounded)
+ENCODING_CACHE_SIZE = 4096
+_ENCODING_CACHE: Dict[AsmInstr, bytes] = {}
+
 class X64Assembler:
     """Assembles x64 machine code directly"""
     
     def __init__(self):
         self.code = bytearray()
         self.labels = {}
-        self.fixups = []
+        self.fixups = []  # (offset, label) of rel32 fields awaiting a forward label
         self.rip = 0
+        self.pos = 0  # Write cursor into code
+        self._label_ref = False  # Whether the current instruction referenced a label
         
-    def assemble(self, instructions: List[Dict]) -> bytes:
+    def assemble(self, instructions: List[Union[AsmInstr, AsmLabel]]) -> bytes:
         """Assembles a list of instructions into machine code"""
-        self.code = bytearray()
         self.labels = {}
         self.fixups = []
         self.rip = 0
         
-        # First pass - collect labels
-        pos = 0
+        # Single pass into a buffer sized for the worst case: labels are
+        # recorded as they are reached, backward references resolve
+        # immediately and forward ones are patched once all labels are known
+        self.code = bytearray(len(instructions) * MAX_INSTRUCTION_SIZE)
+        self.pos = 0
         for instr in instructions:
-            if 'label' in instr:
-                self.labels[instr['label']] = pos
+            if type(instr) is AsmLabel:
+                self.labels[instr.name] = self.pos
             else:
-                pos += self._get_instruction_size(instr)
-                
-        # Second pass - generate code
-        for instr in instructions:
-            if 'label' not in instr:
                 self._emit_instruction(instr)
-                
+        del self.code[self.pos:]
+        
         # Apply fixups
         for offset, label in self.fixups:
-            if label in self.labels:
-                target = self.labels[label]
-                rel = target - (offset + 4)  # Relative to next instruction
-                self.code[offset:offset+4] = struct.pack('<i', rel)
+            target = self.labels.get(label)
+            if target is None:
+                raise ValueError(f"Undefined label: {label}")
+            _S32.pack_into(self.code, offset, target - (offset + 4))  # Relative to next instruction
                 
         return bytes(self.code)
         
-    def _emit_instruction(self, instr: Dict):
+    def _emit_instruction(self, instr: AsmInstr):
         """Emits a single instruction"""
-        opcode = instr['opcode']
-        operands = instr.get('operands', [])
+        cached = _ENCODING_CACHE.get(instr)
+        if cached is not None:
+            self._emit(cached)
+            return
+            
+        start = self.pos
+        self._label_ref = False
+        opcode = instr.opcode
+        operands = instr.operands
         
-        if opcode == 'push':
-            self._emit_push(operands[0])
-        elif opcode == 'pop':
-            self._emit_pop(operands[0])
-        elif opcode == 'mov':
-            self._emit_mov(operands[0], operands[1])
-        elif opcode == 'lea':
-            self._emit_lea(operands[0], operands[1])
-        elif opcode == 'call':
-            if 'target' in instr:
-                self._emit_call_label(instr['target'])
+        if opcode == 'call':
+            if instr.target is not None:
+                self._emit_call_label(instr.target)
             else:
                 self._emit_call_reg(operands[0])
-        elif opcode == 'ret':
-            self._emit_ret()
-        elif opcode == 'sub':
-            self._emit_sub(operands[0], operands[1])
-        elif opcode == 'add':
-            self._emit_add(operands[0], operands[1])
-        elif opcode == 'xor':
-            self._emit_xor(operands[0], operands[1])
+        else:
+            entry = self._EMITTERS.get(opcode)
+            if entry is not None:
+                emitter, arity = entry
+                emitter(self, *operands[:arity])
+                
+        if self.pos == start:
+            raise ValueError(f"Cannot encode instruction: {opcode} {operands}")
+            
+        # Displacements depend on where the instruction lands, so only
+        # label-free encodings can be reused
+        if not self._label_ref:
+            if len(_ENCODING_CACHE) >= ENCODING_CACHE_SIZE:
+                del _ENCODING_CACHE[next(iter(_ENCODING_CACHE))]
+            _ENCODING_CACHE[instr] = bytes(self.code[start:self.pos])
             
+    def _emit(self, data: bytes):
+        """Writes data at the cursor and advances it"""
+        end = self.pos + len(data)
+        self.code[self.pos:end] = data
+        self.pos = end
+        
+    def _emit_rel32(self, label: str):
+        """Emits a 32-bit displacement to label, relative to the next instruction"""
+        self._label_ref = True
+        target = self.labels.get(label)
+        if target is None:
+            # Forward (or undefined) label: leave 0 until the fixup pass
+            self.fixups.append((self.pos, label))
+            self._emit(bytes(4))
+        else:
+            _S32.pack_into(self.code, self.pos, target - (self.pos + 4))
+            self.pos += 4
+        
     def _emit_push(self, op):
         """Emits PUSH instruction"""
         reg = self._get_register(op)
         if reg is not None:
-            # REX prefix if needed
-            if reg.value >= 8:
-                self.code.append(0x41)
-            # Opcode
-            self.code.append(0x50 + (reg.value & 7))
+            self._emit(_PUSH_R[reg.value])
             
     def _emit_pop(self, op):
         """Emits POP instruction"""
         reg = self._get_register(op)
         if reg is not None:
-            # REX prefix if needed
-            if reg.value >= 8:
-                self.code.append(0x41)
-            # Opcode
-            self.code.append(0x58 + (reg.value & 7))
+            self._emit(_POP_R[reg.value])
             
     def _emit_mov(self, dst, src):
         """Emits MOV instruction"""
         dst_reg = self._get_register(dst)
         src_reg = self._get_register(src)
         
-        if dst_reg is not None:
+        if dst_reg is None:
+            mem = self._get_memory(dst)
+            if mem is not None:
+                base, disp = mem
+                if src_reg is not None:
+                    # mov [base + disp], reg
+                    self._emit(bytes((_rex_w(src_reg.value, base.value), 0x89))
+                               + _modrm_disp(src_reg.value, base.value, disp))
+                elif isinstance(src, int) and _fits_imm32(src):
+                    # mov qword [base + disp], imm32 (sign-extended)
+                    self._emit(bytes((_rex_w(0, base.value), 0xC7))
+                               + _modrm_disp(0, base.value, disp) + _S32.pack(src))
+        elif isinstance(src, str) and src_reg is None:
+            mem = self._get_memory(src)
+            if mem is not None:
+                # mov reg, [base + disp]
+                base, disp = mem
+                self._emit(bytes((_rex_w(dst_reg.value, base.value), 0x8B))
+                           + _modrm_disp(dst_reg.value, base.value, disp))
+        else:
             if isinstance(src, int):
                 # mov reg, imm
-                rex = 0x48 if dst_reg.value >= 8 else 0x40
-                self.code.append(rex)
-                self.code.append(0xB8 + (dst_reg.value & 7))
-                # Handle negative numbers correctly
-                if -0x80000000 <= src <= 0x7FFFFFFF:
-                    self.code.extend(struct.pack('<i', src))
+                if src == 0:
+                    # Shorter, and recognized by the CPU as dependency-breaking
+                    self._emit(_ZERO_R[dst_reg.value])
+                    return
+                if 0 <= src <= 0xFFFFFFFF:
+                    # mov r32, imm32 (zero-extends into the 64-bit register)
+                    self._emit(_MOV_R32_IMM[dst_reg.value] + _U32.pack(src))
+                    return
+                rex = 0x49 if dst_reg.value >= 8 else 0x48  # REX.W (+B)
+                if _fits_imm32(src):
+                    # mov r/m64, imm32 (sign-extended)
+                    self._emit(bytes((rex, 0xC7, 0xC0 + (dst_reg.value & 7))) + _S32.pack(src))
                 else:
-                    self.code.extend(struct.pack('<Q', src & 0xFFFFFFFFFFFFFFFF))
+                    # mov r64, imm64
+                    self._emit(bytes((rex, 0xB8 + (dst_reg.value & 7))) + _U64.pack(src & 0xFFFFFFFFFFFFFFFF))
             elif src_reg is not None:
                 # mov reg, reg
-                rex = 0x48
-                if dst_reg.value >= 8:
-                    rex |= 0x44
-                if src_reg.value >= 8:
-                    rex |= 0x41
-                self.code.append(rex)
-                self.code.append(0x89)
-                self.code.append(0xC0 + ((src_reg.value & 7) << 3) + (dst_reg.value & 7))
+                self._emit(_MOV_RR[(dst_reg.value << 4) | src_reg.value])
                 
     def _emit_lea(self, dst, src):
         """Emits LEA instruction"""
         dst_reg = self._get_register(dst)
         if dst_reg is not None and isinstance(src, str):
-            # lea reg, [label]
-            rex = 0x48 if dst_reg.value >= 8 else 0x40
-            self.code.append(rex)
-            self.code.append(0x8D)
-            self.code.append(0x05 + ((dst_reg.value & 7) << 3))
-            # Add fixup for label
-            self.fixups.append((len(self.code), src.strip('[]')))
-            self.code.extend([0, 0, 0, 0])
+            mem = self._get_memory(src)
+            if mem is not None:
+                # lea reg, [base + disp]
+                base, disp = mem
+                self._emit(bytes((_rex_w(dst_reg.value, base.value), 0x8D))
+                           + _modrm_disp(dst_reg.value, base.value, disp))
+            else:
+                # lea reg, [label]
+                rex = 0x4C if dst_reg.value >= 8 else 0x48  # REX.W (+R, dst is ModRM.reg)
+                self._emit(bytes((rex, 0x8D, 0x05 + ((dst_reg.value & 7) << 3))))
+                self._emit_rel32(src.strip('[]'))
             
     def _emit_call_label(self, label: str):
         """Emits CALL instruction with label"""
-        self.code.append(0xE8)
-        self.fixups.append((len(self.code), label))
-        self.code.extend([0, 0, 0, 0])
+        self._emit(b'\xE8')
+        self._emit_rel32(label)
         
     def _emit_call_reg(self, reg):
         """Emits CALL instruction with register"""
         reg_obj = self._get_register(reg)
         if reg_obj is not None:
-            if reg_obj.value >= 8:
-                self.code.append(0x41)
-            self.code.append(0xFF)
-            self.code.append(0xD0 + (reg_obj.value & 7))
+            self._emit(_CALL_R[reg_obj.value])
             
     def _emit_ret(self):
         """Emits RET instruction"""
-        self.code.append(0xC3)
+        self._emit(b'\xC3')
         
     def _emit_sub(self, dst, src):
         """Emits SUB instruction"""
         dst_reg = self._get_register(dst)
         if dst_reg is not None and isinstance(src, int):
             # sub reg, imm
-            rex = 0x48 if dst_reg.value >= 8 else 0x40
-            self.code.append(rex)
-            self.code.append(0x81)
-            self.code.append(0xE8 + (dst_reg.value & 7))
-            if -0x80 <= src <= 0x7F:
-                self.code.extend(struct.pack('<b', src))
+            rex = 0x49 if dst_reg.value >= 8 else 0x48  # REX.W (+B)
+            if _fits_imm8(src):
+                self._emit(bytes((rex, 0x83, 0xE8 + (dst_reg.value & 7))) + _S8.pack(src))
             else:
-                self.code.extend(struct.pack('<i', src))
+                self._emit(bytes((rex, 0x81, 0xE8 + (dst_reg.value & 7))) + _S32.pack(src))
+        elif dst_reg is not None:
+            src_reg = self._get_register(src)
+            if src_reg is not None:
+                # sub reg, reg
+                self._emit(_SUB_RR[(dst_reg.value << 4) | src_reg.value])
                 
     def _emit_add(self, dst, src):
         """Emits ADD instruction"""
         dst_reg = self._get_register(dst)
         if dst_reg is not None and isinstance(src, int):
             # add reg, imm
-            rex = 0x48 if dst_reg.value >= 8 else 0x40
-            self.code.append(rex)
-            self.code.append(0x81)
-            self.code.append(0xC0 + (dst_reg.value & 7))
-            if -0x80 <= src <= 0x7F:
-                self.code.extend(struct.pack('<b', src))
+            rex = 0x49 if dst_reg.value >= 8 else 0x48  # REX.W (+B)
+            if _fits_imm8(src):
+                self._emit(bytes((rex, 0x83, 0xC0 + (dst_reg.value & 7))) + _S8.pack(src))
+            elif _fits_imm32(src):
+                self._emit(bytes((rex, 0x81, 0xC0 + (dst_reg.value & 7))) + _S32.pack(src))
+        elif dst_reg is not None:
+            src_reg = self._get_register(src)
+            if src_reg is not None:
+                # add reg, reg
+                self._emit(_ADD_RR[(dst_reg.value << 4) | src_reg.value])
             else:
-                self.code.extend(struct.pack('<i', src))
+                mem = self._get_memory(src)
+                if mem is not None:
+                    # add reg, [base + disp]
+                    base, disp = mem
+                    self._emit(bytes((_rex_w(dst_reg.value, base.value), 0x03))
+                               + _modrm_disp(dst_reg.value, base.value, disp))
+        else:
+            mem = self._get_memory(dst)
+            if mem is not None:
+                base, disp = mem
+                src_reg = self._get_register(src)
+                if src_reg is not None:
+                    # add [base + disp], reg
+                    self._emit(bytes((_rex_w(src_reg.value, base.value), 0x01))
+                               + _modrm_disp(src_reg.value, base.value, disp))
+                elif isinstance(src, int) and _fits_imm8(src):
+                    # add qword [base + disp], imm8
+                    self._emit(bytes((_rex_w(0, base.value), 0x83))
+                               + _modrm_disp(0, base.value, disp) + _S8.pack(src))
+                elif isinstance(src, int) and _fits_imm32(src):
+                    # add qword [base + disp], imm32
+                    self._emit(bytes((_rex_w(0, base.value), 0x81))
+                               + _modrm_disp(0, base.value, disp) + _S32.pack(src))
                 
     def _emit_xor(self, dst, src):
         """Emits XOR instruction"""
@@ -256,52 +417,54 @@ class X64Assembler:
         src_reg = self._get_register(src)
         if dst_reg is not None and src_reg is not None:
             # xor reg, reg
-            rex = 0x48
-            if dst_reg.value >= 8:
-                rex |= 0x44
-            if src_reg.value >= 8:
-                rex |= 0x41
-            self.code.append(rex)
-            self.code.append(0x31)
-            self.code.append(0xC0 + ((src_reg.value & 7) << 3) + (dst_reg.value & 7))
+            self._emit(_XOR_RR[(dst_reg.value << 4) | src_reg.value])
             
     def _get_register(self, op) -> Optional[Register]:
         """Gets Register enum from operand"""
+        if type(op) is Register:
+            return op
         if isinstance(op, str):
-            try:
-                return Register[op.upper()]
-            except KeyError:
-                return None
+            reg = _REGISTERS.get(op)
+            if reg is None:
+                # Mixed-case spelling
+                reg = _REGISTERS.get(op.upper())
+            return reg
         return None
         
-    def _get_instruction_size(self, instr: Dict) -> int:
-        """Gets the size of an instruction in bytes"""
-        opcode = instr['opcode']
-        operands = instr.get('operands', [])
-        
-        if opcode in ['push', 'pop']:
-            return 1 + (1 if self._needs_rex(operands[0]) else 0)
-        elif opcode == 'mov':
-            return self._get_mov_size(operands[0], operands[1])
-        elif opcode == 'lea':
-            return 7  # REX + LEA + ModRM + displacement
-        elif opcode == 'call':
-            return 5 if 'target' in instr else 2
-        elif opcode == 'ret':
-            return 1
-        elif opcode in ['add', 'sub']:
-            return 4 + (1 if self._needs_rex(operands[0]) else 0)
-        elif opcode == 'xor':
-            return 3 + (1 if self._needs_rex(operands[0]) or self._needs_rex(operands[1]) else 0)
-        return 0
-        
-    def _get_mov_size(self, dst, src) -> int:
-        """Gets the size of a MOV instruction"""
-        if isinstance(src, int):
-            return 10  # REX + MOV + imm64
-        return 3 + (1 if self._needs_rex(dst) or self._needs_rex(src) else 0)
+    def _get_memory(self, op) -> Optional[tuple]:
+        """Splits a '[base +/- disp]' operand (optionally 'qword'-sized) into (Register, disp)"""
+        if not isinstance(op, str):
+            return None
+        if op.startswith('qword '):
+            op = op[6:]
+        if not (op.startswith('[') and op.endswith(']')):
+            return None
+        address = op[1:-1]
+        base, sign, disp = address.partition('+')
+        if not sign:
+            base, sign, disp = address.partition('-')
+        base_reg = self._get_register(base.strip())
+        if base_reg is None:
+            # Label reference
+            return None
+        if not sign:
+            return base_reg, 0
+        disp = int(disp)
+        return base_reg, -disp if sign == '-' else disp
         
     def _needs_rex(self, op) -> bool:
         """Checks if operand needs REX prefix"""
         reg = self._get_register(op)
-        return reg is not None and reg.value >= 8
\ No newline at end of file
+        return reg is not None and reg.value >= 8
+        
+    # Opcode -> (emitter, operand count); 'call' picks its form from the instruction
+    _EMITTERS = {
+        'push': (_emit_push, 1),
+        'pop': (_emit_pop, 1),
+        'mov': (_emit_mov, 2),
+        'lea': (_emit_lea, 2),
+        'ret': (_emit_ret, 0),
+        'sub': (_emit_sub, 2),
+        'add': (_emit_add, 2),
+        'xor': (_emit_xor, 2),
+    }
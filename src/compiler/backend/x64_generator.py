@@ -44,68 +44,101 @@
 # platforms as well.
 #
 # ---------------------------------------------------------------------------------
-from enum import Enum
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 from dataclasses import dataclass
+from bisect import insort
 
-class Register(Enum):
-    RAX = "rax"
-    RBX = "rbx"
-    RCX = "rcx"
-    RDX = "rdx"
-    RSI = "rsi"
-    RDI = "rdi"
-    RSP = "rsp"
-    RBP = "rbp"
-    R8  = "r8"
-    R9  = "r9"
-    R10 = "r10"
-    R11 = "r11"
-    R12 = "r12"
-    R13 = "r13"
-    R14 = "r14"
-    R15 = "r15"
+from .x64_assembler import X64Assembler, AsmInstr, AsmLabel, Register
 
-@dataclass
+# Register operands are Register members; memory, immediate and label operands are text
+Operand = Union[Register, str]
+
+# Directives with no encoding of their own
+_DIRECTIVES = frozenset(("section", "global"))
+
+# Registers handed out to IR temporaries by the linear-scan allocator. All are
+# callee-saved in the Win64 ABI, so values survive calls; each function saves
+# the ones it uses
+_TEMP_REGISTERS = (Register.RBX, Register.RSI, Register.RDI,
+                   Register.R12, Register.R13, Register.R14, Register.R15)
+
+# Never allocated; stages spilled values so no instruction is memory-to-memory
+_SCRATCH = Register.R11
+
+def _is_memory(op: Operand) -> bool:
+    """Whether an operand is a memory reference"""
+    return type(op) is str and op.startswith("qword [")
+
+def _is_imm32(op: Operand) -> bool:
+    """Whether an operand is an immediate that fits a sign-extended imm32"""
+    return (type(op) is str and op.lstrip("-").isdigit()
+            and -0x80000000 <= int(op) <= 0x7FFFFFFF)
+
+# IR instruction fields that name a temporary directly
+_TEMP_FIELDS = ("dest", "src", "src1")
+
+def _instruction_temps(instr: Dict):
+    """Yields every temporary an IR instruction reads or writes"""
+    for key, value in instr.items():
+        if isinstance(value, str):
+            if key in _TEMP_FIELDS:
+                yield value
+        elif isinstance(value, dict):
+            if value.get('type') == 'register':
+                yield value['value']
+        elif isinstance(value, list):
+            for op in value:
+                if isinstance(op, dict) and op.get('type') == 'register':
+                    yield op['value']
+
+@dataclass(frozen=True, slots=True)
 class Instruction:
     """Represents an x64 assembly instruction"""
     opcode: str
-    operands: List[str]
+    operands: List[Operand]
     comment: Optional[str] = None
 
+# Registers carrying the first four call arguments
+_ARG_REGISTERS = (Register.RCX, Register.RDX, Register.R8, Register.R9)
+
+# Argument register save/restore around every call, built once and shared
+_CALL_SAVE = tuple(Instruction("push", [reg]) for reg in _ARG_REGISTERS)
+_CALL_RESTORE = tuple(Instruction("pop", [reg]) for reg in reversed(_ARG_REGISTERS))
+
+# Fixed frame setup and teardown shared by every function; saved temp
+# registers are pushed before and popped after these, outside the rbp frame
+_PROLOG = (
+    Instruction("push", [Register.RBP], "Save old base pointer"),
+    Instruction("mov", [Register.RBP, Register.RSP], "Set up new base pointer"),
+)
+_FRAME_EXIT = (
+    Instruction("mov", [Register.RSP, Register.RBP], "Restore stack pointer"),
+    Instruction("pop", [Register.RBP], "Restore base pointer"),
+)
+_RET = Instruction("ret", [], "Return from function")
+
 class X64Generator:
     """Generates x64 machine code directly"""
     
     def __init__(self):
         self.instructions: List[Instruction] = []
-        self.data_section: List[str] = []
-        self.string_literals: Dict[str, str] = {}
         self.current_function: Optional[str] = None
         self.label_counter: int = 0
+        self._reg_map: Dict[str, Operand] = {}  # Temporary -> register or spill slot
+        self._saved_registers: List[Register] = []  # Callee-saved registers the function uses
+        self._epilog: tuple = ()  # Teardown for the current function
         
     def generate_executable(self, ir: Dict) -> bytes:
-        """Generates a PE executable file from IR"""
+        """Generates x64 machine code for the IR's functions"""
         # Reset state
         self.instructions.clear()
-        self.data_section.clear()
-        self.string_literals.clear()
-        
-        # Generate data section
-        self._generate_data_section()
         
         # Generate code
         self._generate_code_section(ir)
         
-        # Assemble everything into a PE file
+        # Assemble everything into raw .text bytes
         return self._assemble()
         
-    def _generate_data_section(self):
-        """Generates the .data section"""
-        self.data_section.extend([
-            "section .data",
-            "    ; String literals"
-        ])
-        
     def _generate_code_section(self, ir: Dict):
         """Generates the .text section"""
         self.instructions.extend([
@@ -120,14 +153,24 @@ class X64Generator:
     def _generate_function(self, func: Dict):
         """Generates code for a function"""
         self.current_function = func['name']
+        spill_size = self._allocate_registers(func)
         
         # Function prologue
-        self.instructions.extend([
-            Instruction(f"{func['name']}:", [], "Function entry"),
-            Instruction("push", ["rbp"], "Save old base pointer"),
-            Instruction("mov", ["rbp", "rsp"], "Set up new base pointer"),
-            Instruction("sub", ["rsp", str(func['stack_size'])], "Allocate stack space")
-        ])
+        self.instructions.append(Instruction(f"{func['name']}:", [], "Function entry"))
+        self.instructions.extend(
+            Instruction("push", [reg], "Save callee-saved register")
+            for reg in self._saved_registers
+        )
+        self.instructions.extend(_PROLOG)
+        self._epilog = _FRAME_EXIT + tuple(
+            Instruction("pop", [reg], "Restore callee-saved register")
+            for reg in reversed(self._saved_registers)
+        ) + (_RET,)
+        frame_size = func['stack_size'] + spill_size
+        if frame_size:
+            self.instructions.append(
+                Instruction("sub", [Register.RSP, str(frame_size)], "Allocate stack space")
+            )
         
         # Generate code for each block
         for block in func['blocks']:
@@ -148,18 +191,9 @@ class X64Generator:
             
     def _generate_instruction(self, ir_instr: Dict):
         """Generates code for a single IR instruction"""
-        opcode = ir_instr['opcode']
-        
-        if opcode == "load":
-            self._generate_load(ir_instr)
-        elif opcode == "store":
-            self._generate_store(ir_instr)
-        elif opcode == "add":
-            self._generate_add(ir_instr)
-        elif opcode == "call":
-            self._generate_call(ir_instr)
-        elif opcode == "ret":
-            self._generate_return(ir_instr)
+        generator = self._GENERATORS.get(ir_instr['opcode'])
+        if generator is not None:
+            generator(self, ir_instr)
         # ... other opcodes
             
     def _generate_load(self, instr: Dict):
@@ -167,44 +201,77 @@ class X64Generator:
         dst = self._get_register(instr['dest'])
         src = self._get_operand(instr['src'])
         
-        self.instructions.append(
-            Instruction("mov", [dst, src], "Load value")
-        )
+        self._emit_move(dst, src, "Load value")
         
     def _generate_store(self, instr: Dict):
         """Generates code for store"""
         dst = self._get_operand(instr['dest'])
         src = self._get_register(instr['src'])
         
-        self.instructions.append(
-            Instruction("mov", [dst, src], "Store value")
-        )
+        self._emit_move(dst, src, "Store value")
+        
+    def _emit_move(self, dst: Operand, src: Operand, comment: str):
+        """Emits mov dst, src, staging through the scratch register when dst is memory"""
+        if _is_memory(dst) and not (type(src) is Register or _is_imm32(src)):
+            self.instructions.extend([
+                Instruction("mov", [_SCRATCH, src], comment),
+                Instruction("mov", [dst, _SCRATCH])
+            ])
+        else:
+            self.instructions.append(Instruction("mov", [dst, src], comment))
         
     def _generate_add(self, instr: Dict):
         """Generates code for add"""
         dst = self._get_register(instr['dest'])
         src1 = self._get_register(instr['src1'])
-        src2 = self._get_operand(instr['src2'])
+        src2 = instr['src2']
         
-        self.instructions.extend([
-            Instruction("mov", [dst, src1], "Setup add"),
-            Instruction("add", [dst, src2], "Add values")
-        ])
+        if (src2['type'] == 'immediate' and type(dst) is Register and type(src1) is Register
+                and dst != src1 and -0x80000000 <= src2['value'] <= 0x7FFFFFFF):
+            # Three-operand form: no setup move, flags untouched
+            self.instructions.append(
+                Instruction("lea", [dst, f"[{src1.mnemonic} + {src2['value']}]"], "Add values")
+            )
+            return
+            
+        src2 = self._get_operand(src2)
+        if type(dst) is Register and dst == src2:
+            # Commutative: mov dst, src1 would overwrite src2
+            src1, src2 = src2, src1
+            
+        if dst == src1 and not (_is_memory(dst) and _is_memory(src2)):
+            # Already in place
+            self.instructions.append(Instruction("add", [dst, src2], "Add values"))
+        elif _is_memory(dst):
+            # Compute in the scratch register, then store
+            self.instructions.extend([
+                Instruction("mov", [_SCRATCH, src1], "Setup add"),
+                Instruction("add", [_SCRATCH, src2], "Add values"),
+                Instruction("mov", [dst, _SCRATCH])
+            ])
+        else:
+            self.instructions.extend([
+                Instruction("mov", [dst, src1], "Setup add"),
+                Instruction("add", [dst, src2], "Add values")
+            ])
         
     def _generate_call(self, instr: Dict):
         """Generates code for function call"""
+        args = instr['args']
+        if len(args) > len(_ARG_REGISTERS):
+            raise ValueError(
+                f"Call to {instr['target']} has {len(args)} arguments; "
+                f"at most {len(_ARG_REGISTERS)} are passed in registers and stack arguments are not supported"
+            )
+            
         # Save caller-saved registers
-        self.instructions.extend([
-            Instruction("push", [reg.value]) 
-            for reg in [Register.RCX, Register.RDX, Register.R8, Register.R9]
-        ])
+        self.instructions.extend(_CALL_SAVE)
         
         # Load arguments into registers
-        for i, arg in enumerate(instr['args']):
-            reg = [Register.RCX, Register.RDX, Register.R8, Register.R9][i]
-            self.instructions.append(
-                Instruction("mov", [reg.value, self._get_operand(arg)])
-            )
+        self.instructions.extend(
+            Instruction("mov", [reg, self._get_operand(arg)])
+            for reg, arg in zip(_ARG_REGISTERS, args)
+        )
             
         # Call
         self.instructions.append(
@@ -212,16 +279,13 @@ class X64Generator:
         )
         
         # Restore registers
-        self.instructions.extend([
-            Instruction("pop", [reg.value])
-            for reg in reversed([Register.RCX, Register.RDX, Register.R8, Register.R9])
-        ])
+        self.instructions.extend(_CALL_RESTORE)
         
     def _generate_return(self, instr: Dict):
         """Generates code for return"""
         if 'value' in instr:
             self.instructions.append(
-                Instruction("mov", ["rax", self._get_operand(instr['value'])], 
+                Instruction("mov", [Register.RAX, self._get_operand(instr['value'])], 
                           "Set return value")
             )
             
@@ -229,66 +293,116 @@ class X64Generator:
         
     def _generate_function_exit(self):
         """Generates function epilogue"""
-        self.instructions.extend([
-            Instruction("mov", ["rsp", "rbp"], "Restore stack pointer"),
-            Instruction("pop", ["rbp"], "Restore base pointer"),
-            Instruction("ret", [], "Return from function")
-        ])
+        self.instructions.extend(self._epilog)
+        
+    # IR opcode -> code generator
+    _GENERATORS = {
+        "load": _generate_load,
+        "store": _generate_store,
+        "add": _generate_add,
+        "call": _generate_call,
+        "ret": _generate_return,
+    }
+        
+    def _allocate_registers(self, func: Dict) -> int:
+        """Linear-scan allocation of the function's temporaries, returns the spill area size"""
+        # Live interval of each temporary: first and last instruction index
+        intervals: Dict[str, List[int]] = {}
+        pos = 0
+        for block in func['blocks']:
+            for instr in block['instructions']:
+                for temp in _instruction_temps(instr):
+                    interval = intervals.get(temp)
+                    if interval is None:
+                        intervals[temp] = [pos, pos]
+                    else:
+                        interval[1] = pos
+                pos += 1
+                
+        reg_map = self._reg_map
+        reg_map.clear()
+        free = list(reversed(_TEMP_REGISTERS))
+        used = set()
+        active = []  # (end, temp), sorted by end
+        spills = 0
         
-    def _get_register(self, temp: str) -> str:
-        """Maps a temporary to a register"""
-        # Simple round-robin register allocation
-        registers = [Register.R10, Register.R11, Register.R12, Register.R13, 
-                    Register.R14, Register.R15]
-        reg_index = hash(temp) % len(registers)
-        return registers[reg_index].value
+        for temp, (start, end) in sorted(intervals.items(), key=lambda item: item[1][0]):
+            # Release registers of intervals that ended before this one starts
+            while active and active[0][0] < start:
+                free.append(reg_map[active.pop(0)[1]])
+                
+            if free:
+                reg = free.pop()
+                used.add(reg)
+                reg_map[temp] = reg
+                insort(active, (end, temp))
+                continue
+                
+            # Spill whichever of the candidates lives longest
+            spills += 1
+            slot = f"qword [rbp - {func['stack_size'] + 8 * spills}]"
+            last_end, last_temp = active[-1]
+            if last_end > end:
+                reg_map[temp] = reg_map[last_temp]
+                reg_map[last_temp] = slot
+                active.pop()
+                insort(active, (end, temp))
+            else:
+                reg_map[temp] = slot
+                
+        self._saved_registers = [reg for reg in _TEMP_REGISTERS if reg in used]
+        return 8 * spills
         
-    def _get_operand(self, op: Dict) -> str:
+    def _get_register(self, temp: str) -> Operand:
+        """Maps a temporary to its allocated register or spill slot"""
+        return self._reg_map[temp]
+        
+    def _get_operand(self, op: Dict) -> Operand:
         """Converts an IR operand to assembly"""
         if op['type'] == 'register':
             return self._get_register(op['value'])
         elif op['type'] == 'immediate':
             return str(op['value'])
         elif op['type'] == 'memory':
-            return f"[rbp - {op['offset']}]"
+            return f"qword [rbp - {op['offset']}]"
         elif op['type'] == 'string':
-            # Add string to data section if not already present
-            if op['value'] not in self.string_literals:
-                label = f"str_{len(self.string_literals)}"
-                self.string_literals[op['value']] = label
-                self.data_section.append(f'{label} db "{op["value"]}", 0')
-            return self.string_literals[op['value']]
+            # Only .text is produced, so there is nowhere to place the literal
+            raise ValueError(f"String literal operands are not supported: {op['value']!r}")
         else:
             raise ValueError(f"Unknown operand type: {op['type']}")
         
     def _assemble(self) -> bytes:
         """Assembles instructions into machine code"""
-        # Generate assembly text
-        asm = []
-        
-        # Add data section
-        if self.data_section:
-            asm.append("section .data")
-            asm.extend(self.data_section)
-            
-        # Add code section
-        asm.append("section .text")
-        asm.append("global _start")
+        return X64Assembler().assemble(self._assembler_stream())
         
-        # Add instructions
+    def _assembler_stream(self) -> List:
+        """Translates instructions for X64Assembler"""
+        stream = []
         for instr in self.instructions:
-            if instr.comment:
-                asm.append(f"; {instr.comment}")
-            operands = ", ".join(instr.operands)
-            asm.append(f"{instr.opcode} {operands}")
-            
-        # Use NASM to assemble
-        with open("temp.asm", "w") as f:
-            f.write("\n".join(asm))
-            
-        import subprocess
-        subprocess.run(["nasm", "-f", "win64", "temp.asm", "-o", "temp.obj"])
-        
-        # Read object file
-        with open("temp.obj", "rb") as f:
-            return f.read()
\ No newline at end of file
+            opcode = instr.opcode
+            if opcode.endswith(":"):
+                stream.append(AsmLabel(opcode[:-1]))
+                continue
+            if opcode in _DIRECTIVES:
+                continue
+            if opcode == "call" and type(instr.operands[0]) is not Register:
+                # Must name a function in this stream; the assembler rejects anything else
+                stream.append(AsmInstr("call", target=instr.operands[0]))
+                continue
+                
+            operands = []
+            for op in instr.operands:
+                if type(op) is Register:
+                    operands.append(op)
+                elif op.lstrip("-").isdigit():
+                    operands.append(int(op))
+                elif op.startswith("[") or _is_memory(op):
+                    # Address expression, encoded by the assembler
+                    operands.append(op)
+                else:
+                    raise ValueError(
+                        f"Cannot assemble operand {op!r} of '{opcode}': "
+                        "data references are not supported"
+                    )
+            stream.append(AsmInstr(opcode, tuple(operands)))
+        return stream
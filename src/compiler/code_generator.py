@@ -44,10 +44,40 @@
 # The function returns the path to the generated C code file.
 #
 # ---------------------------------------------------------------------------------
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from pathlib import Path
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
 from .parser import MetaForgeLexer, MetaForgeParser
 from .templates import get_template
 
+# MetaForge type -> C type; unknown names pass through unchanged
+_TYPE_MAP = MappingProxyType({
+    'i8': 'int8_t',
+    'i16': 'int16_t',
+    'i32': 'int32_t',
+    'i64': 'int64_t',
+    'u8': 'uint8_t',
+    'u16': 'uint16_t',
+    'u32': 'uint32_t',
+    'u64': 'uint64_t',
+    'f32': 'float',
+    'f64': 'double',
+    'bool': 'int',
+    'void': 'void'
+})
+
+# Literal argument type -> C spelling of its value
+_ARG_RENDERERS = {
+    'StringLiteral': str,  # Strings are already quoted
+    'NumberLiteral': str,
+}
+
+# Body used for functions declared without one
+_EMPTY_BODY = MappingProxyType({'statements': ()})
+
 class CodeGenerator:
     def __init__(self):
         pass
@@ -92,6 +122,42 @@ class CodeGenerator:
             print(f"Error generating code for {mf_file}: {str(e)}")
             return None
             
+    def generate_all(self,
+                     mf_files: List[Path],
+                     output_dir: Path,
+                     output_type: str = "dll",
+                     max_workers: Optional[int] = None) -> List[Optional[Path]]:
+        """
+        Generates C code for several MetaForge files in parallel
+        
+        Each file is read, parsed and written independently, so the work is
+        spread over a process pool (the GIL rules out threads for this).
+        
+        Args:
+            mf_files: Input MetaForge files
+            output_dir: Output directory
+            output_type: Output type ("dll" or "exe")
+            max_workers: Worker processes (defaults to the CPU count)
+            
+        Returns:
+            Path of each generated C file, or None where generation failed,
+            in the order of mf_files
+        """
+        if len(mf_files) < 2:
+            return [self.generate_code(f, output_dir, output_type) for f in mf_files]
+            
+        workers = min(max_workers or os.cpu_count() or 1, len(mf_files))
+        # Hand out files in batches so small files don't pay a round-trip each
+        chunksize = max(1, len(mf_files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                self.generate_code,
+                mf_files,
+                repeat(output_dir),
+                repeat(output_type),
+                chunksize=chunksize
+            ))
+            
     def _generate_c_code(self, ast: Dict, output_type: str) -> str:
         """Generates C code from AST"""
         
@@ -123,66 +189,49 @@ class CodeGenerator:
         
     def _generate_declaration(self, node: Dict) -> str:
         """Generates C code for a declaration"""
-        if node['type'] == 'Function':
-            return self._generate_function(node)
-        elif node['type'] == 'Struct':
-            return self._generate_struct(node)
-        elif node['type'] == 'Import':
-            return self._generate_import(node)
-        else:
+        generator = self._DECLARATION_GENERATORS.get(node['type'])
+        if generator is None:
             raise ValueError(f"Unsupported declaration type: {node['type']}")
+        return generator(self, node)
 
     def _generate_function(self, node: Dict) -> str:
         """Generates C code for a function"""
-        # If main function, use int as return type
-        if node['name'] == 'main':
+        name = node['name']
+        
+        # If main function, use int as return type and don't export it
+        if name == 'main':
             return_type = 'int'
+            export_spec = ""
         else:
             return_type = self._convert_type(node['return_type'])
-            
-        # If main function, don't export it
-        export_spec = "" if node['name'] == 'main' else "__declspec(dllexport) "
+            export_spec = "__declspec(dllexport) "
         
         # Generate parameters
-        params = self._generate_parameters(node.get('params', []))
+        params = self._generate_parameters(node.get('params', ()))
         
         # Generate body
-        body = self._generate_statements(node.get('body', {'statements': []}))
+        body = self._generate_statements(node.get('body', _EMPTY_BODY))
         
         # Add indentation to body
-        indented_body = '\n    '.join(line for line in body.split('\n'))
+        indented_body = body.replace('\n', '\n    ')
         
         return f"""
-{export_spec}{return_type} {node['name']}({params}) {{
+{export_spec}{return_type} {name}({params}) {{
     {indented_body}
 }}"""
 
     def _convert_type(self, mf_type: str) -> str:
         """Converts a MetaForge type to corresponding C type"""
-        type_map = {
-            'i8': 'int8_t',
-            'i16': 'int16_t', 
-            'i32': 'int32_t',
-            'i64': 'int64_t',
-            'u8': 'uint8_t',
-            'u16': 'uint16_t',
-            'u32': 'uint32_t',
-            'u64': 'uint64_t',
-            'f32': 'float',
-            'f64': 'double',
-            'bool': 'int',
-            'void': 'void'
-        }
-        return type_map.get(mf_type, mf_type)
+        return _TYPE_MAP.get(mf_type, mf_type)
 
     def _generate_statements(self, node: Dict) -> str:
         """Generates C code for a list of statements"""
         statements = []
-        for stmt in node.get('statements', []):
-            if stmt['type'] == 'FunctionCall':
-                statements.append(self._generate_function_call(stmt))
-            elif stmt['type'] == 'Return':
-                statements.append(self._generate_return(stmt))
+        generators = self._STATEMENT_GENERATORS
+        for stmt in node.get('statements', ()):
+            generator = generators.get(stmt['type'])
+            if generator is not None:
+                statements.append(generator(self, stmt))
                 
         return '\n'.join(statements)
         
@@ -190,17 +239,17 @@ class CodeGenerator:
         """Generates C code for a function call"""
         args = []
         for arg in node['arguments']:
-            if arg['type'] == 'StringLiteral':
-                args.append(arg['value'])  # Strings are already quoted
-            elif arg['type'] == 'NumberLiteral':
-                args.append(str(arg['value']))
+            render = _ARG_RENDERERS.get(arg['type'])
+            if render is not None:
+                args.append(render(arg['value']))
                 
         return f"{node['name']}({', '.join(args)});"
         
     def _generate_return(self, node: Dict) -> str:
         """Generates C code for a return statement"""
-        if node['value']['type'] == 'NumberLiteral':
-            return f"return {node['value']['value']};"
+        value = node['value']
+        if value['type'] == 'NumberLiteral':
+            return f"return {value['value']};"
         # ... other value types ...
 
     def _generate_import(self, node: Dict) -> str:
@@ -210,4 +259,14 @@ class CodeGenerator:
         elif node['import_type'] == 'cpp':
             return f'#include <{node["path"]}>'
         else:
-            raise ValueError(f"Unsupported import type: {node['import_type']}")
\ No newline at end of file
+            raise ValueError(f"Unsupported import type: {node['import_type']}")
+            
+    # AST node type -> code generator
+    _DECLARATION_GENERATORS = {
+        'Function': _generate_function,
+        'Import': _generate_import,
+    }
+    _STATEMENT_GENERATORS = {
+        'FunctionCall': _generate_function_call,
+        'Return': _generate_return,
+    }
@@ -40,18 +40,22 @@
 #
 # ---------------------------------------------------------------------------------
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
+import subprocess
+import shutil
 from ..utils.paths import VSPaths
 
 class Compiler:
+    # Import libraries linked for each module, shared by all instances
+    module_libs = {
+        "core": ("ntdll.lib", "kernel32.lib", "advapi32.lib"),
+        "crypto": ("ntdll.lib", "kernel32.lib", "advapi32.lib", "crypt32.lib"),
+        "exploit": ("ntdll.lib", "kernel32.lib", "advapi32.lib", "shell32.lib", "user32.lib")
+    }
+    
     def __init__(self):
         self.vs_paths = VSPaths()
-        
-        self.module_libs = {
-            "core": ["ntdll.lib", "kernel32.lib", "advapi32.lib"],
-            "crypto": ["ntdll.lib", "kernel32.lib", "advapi32.lib", "crypt32.lib"],
-            "exploit": ["ntdll.lib", "kernel32.lib", "advapi32.lib", "shell32.lib", "user32.lib"]
-        }
+        self._vs_env: Optional[Dict[str, str]] = None  # vcvars environment, captured on first compile
 
     def compile(self, 
                 source_file: Path,
@@ -78,21 +82,33 @@ class Compiler:
                 output_type
             )
             
-            # Create batch file
-            batch_file = source_file.parent / "compile.bat"
-            with open(batch_file, "w") as f:
-                f.write(f'@echo off\n')
-                f.write(f'call "{self.vs_paths.get_vcvars_path()}"\n')
-                f.write(" ".join(compile_cmd))
-            
-            # Run compilation
-            subprocess.run([str(batch_file)], check=True)
+            # Run compilation directly in the Visual Studio environment;
+            # the executable is looked up on that environment's PATH
+            env = self._get_vs_environment()
+            path = next((value for key, value in env.items() if key.upper() == "PATH"), None)
+            compile_cmd[0] = shutil.which(compile_cmd[0], path=path) or compile_cmd[0]
+            subprocess.run(compile_cmd, env=env, check=True)
             return True
             
         except Exception as e:
             print(f"Compilation error {source_file}: {str(e)}")
             return False
 
+    def _get_vs_environment(self) -> Dict[str, str]:
+        """Returns the environment set up by vcvars, running it only once"""
+        if self._vs_env is None:
+            output = subprocess.check_output(
+                f'cmd /s /c ""{self.vs_paths.get_vcvars_path()}" >nul && set"',
+                text=True
+            )
+            env = {}
+            for line in output.splitlines():
+                key, sep, value = line.partition("=")
+                if sep and key:
+                    env[key] = value
+            self._vs_env = env
+        return self._vs_env
+
     def _build_compile_command(self,
                              source: Path,
                              output: Path, 
@@ -120,7 +136,7 @@ class Compiler:
         
         # Include paths
         for inc in self.vs_paths.include_paths:
-            cmd.append(f"/I\"{inc}\"")
+            cmd.append(f"/I{inc}")
             
         # Source file
         cmd.append(str(source))
@@ -133,7 +149,7 @@ class Compiler:
         
         # Lib paths
         for lib in self.vs_paths.lib_paths:
-            cmd.append(f"/LIBPATH:\"{lib}\"")
+            cmd.append(f"/LIBPATH:{lib}")
             
         # Module libs
         cmd.extend(self.module_libs[module])
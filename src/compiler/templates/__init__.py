@@ -1,5 +1,6 @@
 from pathlib import Path
 from typing import Dict
+from string import Formatter
 
 # Base template for DLL
 DLL_TEMPLATE = """
@@ -51,7 +52,33 @@ EXE_TEMPLATE = """
 {declarations}
 """
 
-def get_template(output_type: str) -> str:
+class CompiledTemplate:
+    """A format template split into literal chunks and field names once, at import"""
+    __slots__ = ('source', '_parts')
+    
+    def __init__(self, source: str):
+        self.source = source
+        # (literal text, field name or None); '{{' and '}}' are already unescaped
+        self._parts = tuple(
+            (literal, field) for literal, field, _, _ in Formatter().parse(source)
+        )
+        
+    def format(self, **fields: str) -> str:
+        """Fills the template, producing the same text as str.format"""
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(fields[field])
+        return ''.join(out)
+
+# Output type -> compiled template
+_TEMPLATES: Dict[str, CompiledTemplate] = {
+    "dll": CompiledTemplate(DLL_TEMPLATE),
+    "exe": CompiledTemplate(EXE_TEMPLATE),
+}
+
+def get_template(output_type: str) -> CompiledTemplate:
     """
     Returns the appropriate template based on output type
     
@@ -59,14 +86,12 @@ def get_template(output_type: str) -> str:
         output_type: "dll" or "exe"
         
     Returns:
-        Template string
+        Compiled template, filled with its format() method
     """
-    if output_type == "dll":
-        return DLL_TEMPLATE
-    elif output_type == "exe":
-        return EXE_TEMPLATE
-    else:
+    template = _TEMPLATES.get(output_type)
+    if template is None:
         raise ValueError(f"Invalid output type: {output_type}")
+    return template
 
 # Template for functions
 FUNCTION_TEMPLATE = """